@@ -3,25 +3,154 @@ import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
 
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.service import async_extract_config_entry_ids
 from .const import(
     DOMAIN,
-    DEVICES,
-    STATES_MANAGER
+    HUB,
+    SNAPSHOTS,
+    STATES_MANAGER,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_PROXY_PORT,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    CONF_DEADBAND,
+    CONF_MIN_PUBLISH_INTERVAL,
+    DEFAULT_DEADBANDS,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    SERVICE_START_CAPTURE,
+    SERVICE_STOP_CAPTURE,
+    SERVICE_SET_GROUP,
+    ATTR_PATH,
+    ATTR_TIMEOUT,
+    ATTR_RESULTS,
+    ATTR_SPEED,
+    EVENT_GROUP_RESULT,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH
 )
 
 from homeassistant.const import (
     CONF_HOST,
     CONF_PORT,
     ATTR_ENTITY_ID,
+    ATTR_DEVICE_ID,
+    ATTR_AREA_ID,
+    ATTR_STATE,
+    STATE_ON,
+    STATE_OFF,
+    EVENT_HOMEASSISTANT_STOP
 )
+from homeassistant.components.fan import ATTR_PRESET_MODE
 
-from .statemanager import StateManager
+from .hub import DeviceHub
+from .protocol.device import COMMAND_TIMEOUT
+from .protocol.capture import CaptureWriter
+from .snapshot import SnapshotStore
 
 _LOGGER = logging.getLogger(__name__)
 
+PLATFORMS = ["fan", "sensor"]
+
+CAPTURE_SCHEMA = vol.Schema({
+    vol.Required(CONF_HOST): cv.string,
+    vol.Optional(ATTR_PATH): cv.string
+})
+
+SET_GROUP_SCHEMA = vol.All(
+    vol.Schema({
+        **cv.ENTITY_SERVICE_FIELDS,
+        vol.Optional(ATTR_STATE): vol.In([STATE_ON, STATE_OFF]),
+        vol.Optional(ATTR_PRESET_MODE): vol.In([MODE_AUTO, MODE_MANUALLY, MODE_TIMING]),
+        vol.Optional(ATTR_SPEED): vol.In([SPEED_OFF, SPEED_LOW, SPEED_MEDIUM, SPEED_HIGH]),
+        vol.Optional(ATTR_TIMEOUT, default=COMMAND_TIMEOUT): vol.All(
+            vol.Coerce(float), vol.Range(min=0.5, max=COMMAND_TIMEOUT))
+    }),
+    cv.has_at_least_one_key(ATTR_STATE, ATTR_PRESET_MODE, ATTR_SPEED)
+)
+
 
 async def async_setup(hass: HomeAssistant, hass_config: dict):
     hass.data.setdefault(DOMAIN, {})
+    hub = DeviceHub()
+    hass.data[DOMAIN][HUB] = hub
+    snapshots = SnapshotStore(hass, hub)
+    await snapshots.async_load()
+    hass.data[DOMAIN][SNAPSHOTS] = snapshots
+
+    async def async_stop(event):
+        # 关闭前保存最新状态, 由Store在最终写入时落盘
+        snapshots.update()
+        for host in hub.hosts:
+            await async_close_capture(hass, hub.get(host))
+        hub.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop)
+
+    async def async_start_capture(service):
+        host = service.data[CONF_HOST]
+        state_manager = hub.get(host)
+        if state_manager is None:
+            _LOGGER.error(f"Device {host} not found")
+            return
+        if ATTR_PATH in service.data:
+            path = service.data[ATTR_PATH]
+            if not hass.config.is_allowed_path(path):
+                _LOGGER.error(f"Cannot write {path}, no access to path; "
+                              "allowlist_external_dirs may need to be adjusted in configuration.yaml")
+                return
+        else:
+            path = hass.config.path(f"{DOMAIN}_{host}.cap")
+        capture = await hass.async_add_executor_job(CaptureWriter, path)
+        previous = state_manager.stop_capture()
+        state_manager.start_capture(capture)
+        if previous is not None:
+            await hass.async_add_executor_job(previous.close)
+        _LOGGER.info(f"Capturing {host} to {path}")
+
+    async def async_stop_capture(service):
+        host = service.data[CONF_HOST]
+        state_manager = hub.get(host)
+        if state_manager is not None:
+            await async_close_capture(hass, state_manager)
+
+    async def async_group_hosts(service):
+        # 未指定目标时作用于全部设备
+        if not any(key in service.data for key in (ATTR_ENTITY_ID, ATTR_DEVICE_ID, ATTR_AREA_ID)):
+            return hub.hosts
+        hosts = []
+        for entry_id in await async_extract_config_entry_ids(hass, service):
+            config_entry = hass.config_entries.async_get_entry(entry_id)
+            if config_entry is not None and config_entry.domain == DOMAIN:
+                hosts.append(config_entry.data[CONF_HOST])
+        return hosts
+
+    async def async_set_group(service):
+        hosts = await async_group_hosts(service)
+        results = await hub.async_set_group(
+            hosts,
+            service.data.get(ATTR_STATE),
+            service.data.get(ATTR_PRESET_MODE),
+            service.data.get(ATTR_SPEED),
+            service.data[ATTR_TIMEOUT])
+        failed = [host for host, result in results.items() if not result]
+        if len(failed) > 0:
+            _LOGGER.warning(f"Group command confirmed by {len(results) - len(failed)}/{len(results)} "
+                            f"devices, failed: {', '.join(failed)}")
+        else:
+            _LOGGER.info(f"Group command confirmed by {len(results)} devices")
+        hass.bus.async_fire(EVENT_GROUP_RESULT, {ATTR_RESULTS: results})
+
+    hass.services.async_register(DOMAIN, SERVICE_START_CAPTURE, async_start_capture, schema=CAPTURE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_STOP_CAPTURE, async_stop_capture, schema=CAPTURE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_SET_GROUP, async_set_group, schema=SET_GROUP_SCHEMA)
     return True
 
 
@@ -30,29 +159,65 @@ async def async_setup_entry(hass: HomeAssistant, config_entry):
     host = config[CONF_HOST]
     port = config[CONF_PORT]
 
-    state_manager = StateManager(host, port)
-    hass.data[DOMAIN][DEVICES] = []
-    hass.data[DOMAIN][DEVICES].append(host)
+    hub = hass.data[DOMAIN][HUB]
+    snapshots = hass.data[DOMAIN][SNAPSHOTS]
+    if await hub.async_add(host, port, snapshots.get(host)) is False:
+        # 连接失败, 交给Home Assistant稍后重试; 仍在连接的设备先以不可用状态创建实体
+        hub.remove(host)
+        raise ConfigEntryNotReady(f"Unable to connect to {host}:{port}")
+    state_manager = hub.get(host)
+    apply_options(state_manager, config_entry)
+    await state_manager.async_set_proxy(config_entry.options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT))
+    state_manager.set_change_listener(snapshots.changed)
     hass.data[config_entry.entry_id] = {}
     hass.data[config_entry.entry_id][STATES_MANAGER] = state_manager
-    state_manager.open()
+    config_entry.async_on_unload(config_entry.add_update_listener(update_listener))
 
-    for paltform in {"fan", "sensor"}:
+    for paltform in PLATFORMS:
         hass.async_create_task(hass.config_entries.async_forward_entry_setup(
             config_entry, paltform))
 
     return True
 
 
-async def async_unload_entry(hass: HomeAssistant, config_entry):
+async def async_close_capture(hass, state_manager):
+    capture = state_manager.stop_capture()
+    if capture is not None:
+        # 关闭时写出缓冲的帧
+        await hass.async_add_executor_job(capture.close)
+        _LOGGER.info(f"Captured {capture.frames} frames to {capture.path}")
 
-    await hass.config_entries.async_forward_entry_unload(config_entry, "sensor")
 
+def apply_options(state_manager, config_entry):
+    options = config_entry.options
+    state_manager.set_poll_interval(
+        options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+        options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL))
+    for sensor_type, deadband in DEFAULT_DEADBANDS.items():
+        state_manager.set_sensor_filter(
+            sensor_type,
+            options.get(f"{sensor_type}_{CONF_DEADBAND}", deadband),
+            options.get(f"{sensor_type}_{CONF_MIN_PUBLISH_INTERVAL}", DEFAULT_MIN_PUBLISH_INTERVAL))
+
+
+async def update_listener(hass: HomeAssistant, config_entry):
     state_manager = hass.data[config_entry.entry_id][STATES_MANAGER]
-    state_manager.close()
-    hass.data[DOMAIN][DEVICES].pop(config_entry.data[CONF_HOST])
-    if len(hass.data[DOMAIN][DEVICES]) == 0:
-        hass.data.pop(DOMAIN)
+    apply_options(state_manager, config_entry)
+    await state_manager.async_set_proxy(config_entry.options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT))
+
+
+async def async_unload_entry(hass: HomeAssistant, config_entry):
+
+    for paltform in PLATFORMS:
+        await hass.config_entries.async_forward_entry_unload(config_entry, paltform)
+
+    hass.data[DOMAIN][SNAPSHOTS].update()
+    await async_close_capture(hass, hass.data[config_entry.entry_id][STATES_MANAGER])
+    hass.data[DOMAIN][HUB].remove(config_entry.data[CONF_HOST])
     hass.data.pop(config_entry.entry_id)
 
     return True
+
+
+async def async_remove_entry(hass: HomeAssistant, config_entry):
+    hass.data[DOMAIN][SNAPSHOTS].remove(config_entry.data[CONF_HOST])
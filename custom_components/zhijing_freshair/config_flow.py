@@ -1,28 +1,64 @@
 import logging
 
 from homeassistant import config_entries
+from homeassistant.components import network
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
 
 from .const import (
     DOMAIN,
-    DEVICES,
-    DEFAULT_PORT
+    DEFAULT_PORT,
+    CONF_NETWORK,
+    SCAN_MAX_HOSTS,
+    CONF_MIN_POLL_INTERVAL,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_PROXY_PORT,
+    DEFAULT_PROXY_PORT,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    CONF_DEADBAND,
+    CONF_MIN_PUBLISH_INTERVAL,
+    DEFAULT_DEADBANDS,
+    DEFAULT_MIN_PUBLISH_INTERVAL
 )
 
 from homeassistant.const import (
     CONF_HOST,
+    CONF_HOSTS,
     CONF_PORT
 )
 
+from .protocol import async_probe
+from .protocol.discovery import async_scan
+
 _LOGGER = logging.getLogger(__name__)
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    def __init__(self):
+        self._port = DEFAULT_PORT
+        self._found = []
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return OptionsFlowHandler(config_entry)
+
+    def _configured_hosts(self):
+        return {entry.data[CONF_HOST] for entry in self._async_current_entries()}
+
     async def async_step_user(self, user_input=None, error=None):
         if user_input is not None:
-            if DOMAIN in self.hass.data and DEVICES in self.hass.data[DOMAIN] and \
-                    user_input[CONF_HOST] in self.hass.data[DOMAIN][DEVICES]:
+            if not user_input.get(CONF_HOST):
+                # 未填写地址时扫描局域网
+                self._port = user_input[CONF_PORT]
+                return await self.async_step_scan()
+            elif user_input[CONF_HOST] in self._configured_hosts():
+                # 以配置条目为准, 等待重试的条目不在hub中
                 return await self.async_step_user(error="device_exist")
+            elif not await async_probe(user_input[CONF_HOST], user_input[CONF_PORT]):
+                return await self.async_step_user(error="cannot_connect")
             else:
                 return self.async_create_entry(
                     title=user_input[CONF_HOST],
@@ -31,8 +67,95 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return self.async_show_form(
             step_id="user",
             data_schema=vol.Schema({
-                vol.Required(CONF_HOST): str,
+                vol.Optional(CONF_HOST): str,
                 vol.Required(CONF_PORT, default=DEFAULT_PORT): vol.Coerce(int)
             }),
             errors={"base": error} if error else None
         )
+
+    async def async_step_scan(self, user_input=None, error=None):
+        if user_input is not None:
+            try:
+                hosts = await async_scan(user_input[CONF_NETWORK], self._port, max_hosts=SCAN_MAX_HOSTS)
+            except ValueError:
+                return await self.async_step_scan(error="invalid_network")
+            configured = self._configured_hosts()
+            self._found = [host for host in hosts if host not in configured]
+            if len(self._found) == 0:
+                return await self.async_step_scan(error="no_devices_found")
+            return await self.async_step_select()
+
+        source_ip = await network.async_get_source_ip(self.hass)
+        return self.async_show_form(
+            step_id="scan",
+            data_schema=vol.Schema({
+                vol.Required(CONF_NETWORK, default=f"{source_ip}/24"): str
+            }),
+            errors={"base": error} if error else None
+        )
+
+    async def async_step_select(self, user_input=None, error=None):
+        if user_input is not None:
+            hosts = user_input[CONF_HOSTS]
+            if len(hosts) == 0:
+                return await self.async_step_select(error="no_devices_selected")
+            # 一个流程只能创建一个条目, 其余设备通过导入流程创建
+            for host in hosts[1:]:
+                self.hass.async_create_task(self.hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": config_entries.SOURCE_IMPORT},
+                    data={CONF_HOST: host, CONF_PORT: self._port}))
+            return self.async_create_entry(
+                title=hosts[0],
+                data={CONF_HOST: hosts[0], CONF_PORT: self._port})
+
+        return self.async_show_form(
+            step_id="select",
+            data_schema=vol.Schema({
+                vol.Required(CONF_HOSTS, default=self._found): cv.multi_select({host: host for host in self._found})
+            }),
+            errors={"base": error} if error else None
+        )
+
+    async def async_step_import(self, user_input):
+        if user_input[CONF_HOST] in self._configured_hosts():
+            return self.async_abort(reason="device_exist")
+        return self.async_create_entry(title=user_input[CONF_HOST], data=user_input)
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    def __init__(self, config_entry):
+        self._config_entry = config_entry
+
+    async def async_step_init(self, user_input=None, error=None):
+        if user_input is not None:
+            if user_input[CONF_MIN_POLL_INTERVAL] > user_input[CONF_MAX_POLL_INTERVAL]:
+                return await self.async_step_init(error="invalid_poll_interval")
+            else:
+                return self.async_create_entry(title="", data=user_input)
+
+        options = self._config_entry.options
+        schema = {
+            vol.Required(
+                CONF_MIN_POLL_INTERVAL,
+                default=options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            vol.Required(
+                CONF_MAX_POLL_INTERVAL,
+                default=options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1))
+        }
+        for sensor_type, deadband in DEFAULT_DEADBANDS.items():
+            key = f"{sensor_type}_{CONF_DEADBAND}"
+            schema[vol.Required(key, default=options.get(key, deadband))] = \
+                vol.All(vol.Coerce(float), vol.Range(min=0))
+            key = f"{sensor_type}_{CONF_MIN_PUBLISH_INTERVAL}"
+            schema[vol.Required(key, default=options.get(key, DEFAULT_MIN_PUBLISH_INTERVAL))] = \
+                vol.All(vol.Coerce(int), vol.Range(min=0))
+        schema[vol.Required(CONF_PROXY_PORT, default=options.get(CONF_PROXY_PORT, DEFAULT_PROXY_PORT))] = \
+            vol.All(vol.Coerce(int), vol.Range(min=0, max=65535))
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(schema),
+            errors={"base": error} if error else None
+        )
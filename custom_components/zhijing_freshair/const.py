@@ -1,23 +1,63 @@
+from .protocol.const import (
+    DEFAULT_PORT,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH,
+    FIELD_SPEED,
+    FIELD_PM25,
+    FIELD_VOC,
+    FIELD_FILTER,
+    FIELD_POLL_INTERVAL,
+    FIELD_POLL_RTT,
+    FIELD_RECONNECTS,
+    FIELD_FRAMES_DROPPED,
+    DEFAULT_DEADBANDS
+)
+
 DOMAIN = "zhijing_freshair"
 
-DEFAULT_PORT = 9600
-DEVICES = "devices"
+HUB = "hub"
+SNAPSHOTS = "snapshots"
 FAN_DEVICES = "fan_devices"
 STATES_MANAGER = "stateS_manager"
 
-DEVICE_CLASS_PM25 = "pm2_5"
-DEVICE_CLASS_VOC = "voc"
-DEVICE_CLASS_FILTER = "filter"
+CONF_NETWORK = "network"
+# 配置流程中最多扫描/22, 约16次探测超时
+SCAN_MAX_HOSTS = 1024
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
+CONF_PROXY_PORT = "proxy_port"
+DEFAULT_PROXY_PORT = 0
+
+SERVICE_START_CAPTURE = "start_capture"
+SERVICE_STOP_CAPTURE = "stop_capture"
+SERVICE_SET_GROUP = "set_group"
+ATTR_PATH = "path"
+ATTR_TIMEOUT = "timeout"
+ATTR_RESULTS = "results"
+EVENT_GROUP_RESULT = f"{DOMAIN}_group_result"
+
+DEVICE_CLASS_PM25 = FIELD_PM25
+DEVICE_CLASS_VOC = FIELD_VOC
+DEVICE_CLASS_FILTER = FIELD_FILTER
+SENSOR_POLL_INTERVAL = FIELD_POLL_INTERVAL
+SENSOR_POLL_RTT = FIELD_POLL_RTT
+SENSOR_RECONNECTS = FIELD_RECONNECTS
+SENSOR_FRAMES_DROPPED = FIELD_FRAMES_DROPPED
 
-MODE_AUTO = "auto"
-MODE_MANUALLY = "manually"
-MODE_TIMING = "timing"
+# 选项键为 f"{sensor_type}_{CONF_DEADBAND}" 与 f"{sensor_type}_{CONF_MIN_PUBLISH_INTERVAL}"
+CONF_DEADBAND = "deadband"
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+DEFAULT_MIN_PUBLISH_INTERVAL = 30
 
-SPEED_OFF = "off"
-SPEED_LOW = "low"
-SPEED_MEDIUM = "medium"
-SPEED_HIGH = "high"
-ATTR_SPEED = "speed"
+ATTR_SPEED = FIELD_SPEED
+ATTR_PENDING = "pending"
 
 DEVICE_INFO = {
             "manufacturer": "BLAUBERG",
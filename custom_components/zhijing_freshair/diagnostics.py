@@ -0,0 +1,19 @@
+from homeassistant.core import HomeAssistant
+
+from .const import STATES_MANAGER
+
+from homeassistant.const import (
+    CONF_HOST,
+    CONF_PORT
+)
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry):
+    # 等待重试等未加载的条目没有StateManager
+    state_manager = hass.data.get(config_entry.entry_id, {}).get(STATES_MANAGER)
+    return {
+        CONF_HOST: config_entry.data[CONF_HOST],
+        CONF_PORT: config_entry.data[CONF_PORT],
+        "options": dict(config_entry.options),
+        "link": state_manager.diagnostics() if state_manager is not None else "not loaded"
+    }
@@ -6,9 +6,9 @@ from homeassistant.const import (
     ATTR_ENTITY_ID,
     STATE_UNKNOWN,
     STATE_ON,
+    STATE_OFF,
     ATTR_MODE,
     ATTR_STATE,
-    ATTR_ICON,
     CONF_HOST
 )
 from homeassistant.components.fan import (
@@ -33,8 +33,13 @@ from .const import (
     SPEED_LOW,
     SPEED_MEDIUM,
     SPEED_HIGH,
-    ATTR_SPEED
+    ATTR_SPEED,
+    ATTR_PENDING
 )
+from .protocol.device import LINK_CLOSED
+
+ICON_ON = "mdi:fan"
+ICON_OFF = "mdi:fan-off"
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -56,15 +61,21 @@ class FreshAirFan(FanEntity):
         self._state = STATE_UNKNOWN
         self._mode = MODE_AUTO
         self._speed = 0
-        self._icon = "mdi:fan"
+        self._icon = ICON_ON
+        # 已乐观显示、等待设备确认的命令, 属性 -> (请求值, future)
+        self._pending = {}
         self._device_info = DEVICE_INFO
         self._device_info["identifiers"] = {(DOMAIN, host)}
         self._attr_preset_modes = [MODE_AUTO, MODE_MANUALLY, MODE_TIMING]
         self._attr_supported_features = SUPPORT_SET_SPEED | SUPPORT_PRESET_MODE
-        self._states_manager.set_fan_update(self.update_status)
+        self._states_manager.set_fan(self)
 
-    def set_percentage(self, percentage: int) -> None:
+    async def async_will_remove_from_hass(self):
+        self._states_manager.remove_fan()
+        # 卸载时队列中的命令都以False结束, 已移除的实体不再回滚
+        self._pending.clear()
 
+    async def async_set_percentage(self, percentage: int) -> None:
         if percentage == 0:
             speed = SPEED_OFF
         elif percentage <= 33:
@@ -74,10 +85,7 @@ class FreshAirFan(FanEntity):
         else:
             speed = SPEED_HIGH
         _LOGGER.debug(f"set speed to {speed}")
-        self.set_speed(speed)
-
-    async def async_set_percentage(self, percentage: int) -> None:
-        await self.hass.async_add_executor_job(self.set_percentage, percentage)
+        await self.async_set_speed(speed)
 
     async def async_increase_speed(self):
         if self._speed != SPEED_HIGH:
@@ -87,7 +95,7 @@ class FreshAirFan(FanEntity):
                 speed = SPEED_MEDIUM
             else:
                 speed = SPEED_HIGH
-            self.set_speed(speed)
+            await self.async_set_speed(speed)
 
     async def async_decrease_speed(self):
         if self._speed != SPEED_OFF:
@@ -97,7 +105,7 @@ class FreshAirFan(FanEntity):
                 speed = SPEED_LOW
             else:
                 speed = SPEED_LOW
-            self.set_speed(speed)
+            await self.async_set_speed(speed)
 
     def oscillate(self, oscillating: bool) -> None:
         pass
@@ -168,39 +176,77 @@ class FreshAirFan(FanEntity):
         data[ATTR_PRESET_MODE] = self.preset_mode
         return data
 
+    @property
+    def extra_state_attributes(self):
+        return {ATTR_PENDING: list(self._pending)}
+
     @property
     def should_poll(self):
         return False
 
-    def update_status(self, data: dict):
-        if ATTR_SPEED in data:
-            self._speed = data[ATTR_SPEED]
-        if ATTR_MODE in data:
-            self._mode = data[ATTR_MODE]
-        if ATTR_STATE in data:
-            self._state = data[ATTR_STATE]
-        if ATTR_ICON in data:
-            self._icon = data[ATTR_ICON]
-        try:
-            self.schedule_update_ha_state()
-        except Exception:
-            pass
-
-    def turn_on(
+    @property
+    def available(self):
+        return self._states_manager.available
+
+    def _set_status(self, fan_state, mode, speed):
+        if fan_state == self._state and mode == self._mode and speed == self._speed:
+            return False
+        self._state = fan_state
+        self._mode = mode
+        self._speed = speed
+        self._icon = ICON_ON if self._state == STATE_ON else ICON_OFF
+        return True
+
+    def update_status(self, state):
+        # 等待确认的属性保持乐观值, 避免命令生效前的上报把界面改回去
+        pending = self._pending
+        return self._set_status(
+            self._state if ATTR_STATE in pending else state.state,
+            self._mode if ATTR_MODE in pending else state.mode,
+            self._speed if ATTR_SPEED in pending else state.speed)
+
+    def _send_optimistic(self, attr, value, future):
+        self._pending[attr] = (value, future)
+        if attr == ATTR_STATE:
+            self._set_status(value, self._mode, self._speed)
+        elif attr == ATTR_MODE:
+            self._set_status(self._state, value, self._speed)
+        else:
+            self._set_status(self._state, self._mode, value)
+        self.async_write_ha_state()
+        future.add_done_callback(lambda done: self._on_command_done(attr, done))
+
+    def _on_command_done(self, attr, future):
+        pending = self._pending.get(attr)
+        if pending is None or pending[1] is not future:
+            # 已被同一属性的新命令取代, 或实体已移除
+            return
+        del self._pending[attr]
+        state = self._states_manager.state
+        if (future.cancelled() or not future.result()) and self._states_manager.link_state != LINK_CLOSED:
+            _LOGGER.warning(f"{self.entity_id} {attr} = {pending[0]} not confirmed by the device, "
+                            f"rolled back to {getattr(state, attr)}")
+        self.update_status(state)
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    async def async_turn_on(
             self,
-            percentage: int,
-            preset_mode: str,
+            percentage: int = None,
+            preset_mode: str = None,
             **kwargs,
     ):
-        self._states_manager.turn_on()
+        if self._state != STATE_ON:
+            self._send_optimistic(ATTR_STATE, STATE_ON, self._states_manager.turn_on())
 
-    def turn_off(self, **kwargs):
-        self._states_manager.turn_off()
+    async def async_turn_off(self, **kwargs):
+        if self._state != STATE_OFF:
+            self._send_optimistic(ATTR_STATE, STATE_OFF, self._states_manager.turn_off())
 
-    def set_speed(self, speed: str):
+    async def async_set_speed(self, speed: str):
         if speed != self._speed:
-            self._states_manager.set_speed(speed)
+            self._send_optimistic(ATTR_SPEED, speed, self._states_manager.set_speed(speed))
 
-    def set_preset_mode(self, preset_mode: str):
+    async def async_set_preset_mode(self, preset_mode: str):
         if preset_mode != self._mode:
-            self._states_manager.set_mode(preset_mode)
\ No newline at end of file
+            self._send_optimistic(ATTR_MODE, preset_mode, self._states_manager.set_mode(preset_mode))
\ No newline at end of file
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+from .statemanager import StateManager
+from .protocol.const import (
+    STATE_ON,
+    STATE_OFF
+)
+from .protocol.device import (
+    POLL_INTERVAL,
+    CONNECT_TIMEOUT,
+    COMMAND_TIMEOUT
+)
+
+# 黄金分割, 任意数量的设备都能在轮询周期内均匀错开
+POLL_SPREAD = 0.618033988749895
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceHub:
+    """Owner of all device sessions of the integration.
+
+    Every unit is a single socket on Home Assistant's event loop, the hub only
+    keeps the per-host StateManager handles and spreads their poll phases over
+    the poll interval so units don't poll at the same moment.
+
+    Units added within one CONNECT_TIMEOUT window share its deadline, so
+    entries set up together connect concurrently and a slow host only delays
+    startup once.
+    """
+    def __init__(self):
+        self._state_managers = {}
+        self._slot = 0
+        self._deadline = None
+        self._tasks = set()
+
+    def __contains__(self, host):
+        return host in self._state_managers
+
+    def __len__(self):
+        return len(self._state_managers)
+
+    @property
+    def hosts(self):
+        return list(self._state_managers)
+
+    def get(self, host):
+        return self._state_managers.get(host)
+
+    def _next_poll_offset(self):
+        offset = (self._slot * POLL_SPREAD) % 1 * POLL_INTERVAL
+        self._slot += 1
+        return offset
+
+    async def async_add(self, host, port, snapshot=None):
+        """Add a unit and wait for it to connect, at most until the shared deadline.
+
+        Returns the result of its async_open(), None if it is still connecting
+        in the background or was already added.
+        """
+        result = None
+        state_manager = self._state_managers.get(host)
+        if state_manager is None:
+            state_manager = StateManager(host, port, self._next_poll_offset())
+            if snapshot is not None:
+                state_manager.restore(snapshot)
+            self._state_managers[host] = state_manager
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._deadline is None or self._deadline <= now:
+                self._deadline = now + CONNECT_TIMEOUT
+            task = loop.create_task(state_manager.async_open())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            try:
+                # 超时后连接在后台继续
+                result = await asyncio.wait_for(asyncio.shield(task), self._deadline - now)
+            except asyncio.TimeoutError:
+                _LOGGER.debug(f"Device {host} still connecting")
+        return result
+
+    def _submit_group(self, state_manager, state, mode, speed):
+        # 先开机再调模式和风速, 关机放在最后
+        futures = []
+        if state == STATE_ON:
+            futures.append(state_manager.turn_on())
+        if mode is not None:
+            futures.append(state_manager.set_mode(mode))
+        if speed is not None:
+            futures.append(state_manager.set_speed(speed))
+        if state == STATE_OFF:
+            futures.append(state_manager.turn_off())
+        return asyncio.gather(*futures)
+
+    async def async_set_group(self, hosts, state=None, mode=None, speed=None, timeout=COMMAND_TIMEOUT):
+        """Send the same command to several units concurrently.
+
+        All units share one deadline. Returns {host: confirmed}; a unit that is
+        unknown or has not confirmed every part of the command by the deadline
+        counts as failed, its command stays queued until COMMAND_TIMEOUT.
+        """
+        tasks = {}
+        for host in hosts:
+            state_manager = self._state_managers.get(host)
+            if state_manager is not None:
+                tasks[host] = self._submit_group(state_manager, state, mode, speed)
+        if len(tasks) > 0:
+            await asyncio.wait(tasks.values(), timeout=timeout)
+        return {host: host in tasks and tasks[host].done() and all(tasks[host].result()) for host in hosts}
+
+    def remove(self, host):
+        state_manager = self._state_managers.pop(host, None)
+        if state_manager is not None:
+            state_manager.close()
+
+    def close(self):
+        for host in self.hosts:
+            self.remove(host)
+        for task in self._tasks:
+            task.cancel()
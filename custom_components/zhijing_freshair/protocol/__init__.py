@@ -0,0 +1,19 @@
+"""Home Assistant-free core of the Zhijing freshair integration.
+
+Only the standard library is imported, so tools and tests can use the
+protocol without Home Assistant, e.g. from the integration directory:
+
+    python -m protocol.device_benchmark
+"""
+from .const import DEFAULT_PORT
+from .state import DeviceState
+from .device import (
+    DeviceInterface,
+    FrameParser,
+    async_probe,
+    decode_reports,
+    LINK_CONNECTING,
+    LINK_CONNECTED,
+    LINK_BACKOFF,
+    LINK_CLOSED
+)
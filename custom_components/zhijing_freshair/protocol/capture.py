@@ -0,0 +1,133 @@
+"""Binary capture of device traffic and replay through the decoder.
+
+A capture file starts with CAPTURE_MAGIC followed by records of
+RECORD (frame length, direction, monotonic timestamp) and the frame bytes.
+
+Replay a capture as fast as possible from the integration directory:
+
+    python -m protocol.capture freshair.cap
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from .device import (
+    DeviceInterface,
+    MSG_REPORT_LENGTH,
+    HISTORY_FIELDS
+)
+from .state import FAN_MASK
+
+CAPTURE_MAGIC = b"ZJFC\x01"
+CAPTURE_BUFFER = 64 * 1024
+RECORD = struct.Struct("<HBd")
+
+DIRECTION_RECEIVED = 0
+DIRECTION_SENT = 1
+
+
+class CaptureWriter:
+    """Append frames to a capture file through a large write buffer.
+
+    Writes are memory copies until the buffer fills, so the writer can be
+    driven from the event loop. Open and close it in the executor.
+    """
+    def __init__(self, path):
+        self._path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab", buffering=CAPTURE_BUFFER)
+        if new_file:
+            self._file.write(CAPTURE_MAGIC)
+        self.frames = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    def write(self, direction, frame):
+        self._file.write(RECORD.pack(len(frame), direction, time.monotonic()))
+        self._file.write(frame)
+        self.frames += 1
+
+    def received(self, frame):
+        self.write(DIRECTION_RECEIVED, frame)
+
+    def sent(self, frame):
+        self.write(DIRECTION_SENT, frame)
+
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path):
+    """Yield (timestamp, direction, frame) of every record in a capture.
+
+    The file is memory-mapped and frames are memoryviews into the mapping,
+    they are only valid until the next record is read.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= len(CAPTURE_MAGIC):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+                raise ValueError(f"{path} is not a capture file")
+            view = memoryview(mapped)
+            frame = None
+            try:
+                pos = len(CAPTURE_MAGIC)
+                end = len(mapped)
+                while pos + RECORD.size <= end:
+                    length, direction, timestamp = RECORD.unpack_from(mapped, pos)
+                    pos += RECORD.size
+                    if pos + length > end:
+                        break
+                    frame = view[pos: pos + length]
+                    pos += length
+                    yield timestamp, direction, frame
+                    frame.release()
+            finally:
+                if frame is not None:
+                    frame.release()
+                view.release()
+
+
+def replay(path, device):
+    """Feed the received reports of a capture through device.process_report().
+
+    The reading history is timestamped with the capture's timestamps, so its
+    rolling windows cover the captured time. Returns the number of reports
+    replayed.
+    """
+    reports = 0
+    for timestamp, direction, frame in read_capture(path):
+        if direction == DIRECTION_RECEIVED and len(frame) == MSG_REPORT_LENGTH:
+            device.process_report(frame, timestamp)
+            reports += 1
+    return reports
+
+
+def main(args):
+    changes = [0, 0]
+
+    def on_state_changed(state, changed):
+        if changed & FAN_MASK:
+            changes[0] += 1
+        if changed & ~FAN_MASK:
+            changes[1] += 1
+
+    device = DeviceInterface("127.0.0.1", 0, on_state_changed)
+    start = time.perf_counter()
+    reports = replay(args.path, device)
+    elapsed = time.perf_counter() - start
+    print(f"replayed {reports} reports in {elapsed:.3f}s ({reports / max(elapsed, 1e-9):,.0f} reports/s)")
+    print(f"fan state changes {changes[0]}, sensor state changes {changes[1]}")
+    for field in HISTORY_FIELDS:
+        print(f"{field}: {device.history.statistics(field)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a Zhijing freshair capture")
+    parser.add_argument("path", help="capture file")
+    main(parser.parse_args())
@@ -0,0 +1,45 @@
+"""Constants of the wire protocol.
+
+Field names and state values are the same strings Home Assistant uses
+(state, mode, temperature, on, ...), so the integration can use them as
+attribute names and sensor types directly.
+"""
+DEFAULT_PORT = 9600
+
+STATE_ON = "on"
+STATE_OFF = "off"
+
+MODE_AUTO = "auto"
+MODE_MANUALLY = "manually"
+MODE_TIMING = "timing"
+
+SPEED_OFF = "off"
+SPEED_LOW = "low"
+SPEED_MEDIUM = "medium"
+SPEED_HIGH = "high"
+
+# DeviceState字段
+FIELD_STATE = "state"
+FIELD_MODE = "mode"
+FIELD_SPEED = "speed"
+FIELD_TEMPERATURE = "temperature"
+FIELD_HUMIDITY = "humidity"
+FIELD_PM25 = "pm2_5"
+FIELD_VOC = "voc"
+FIELD_FILTER = "filter"
+FIELD_POLL_INTERVAL = "poll_interval"
+FIELD_POLL_RTT = "poll_rtt"
+FIELD_RECONNECTS = "reconnects"
+FIELD_FRAMES_DROPPED = "frames_dropped"
+
+# 秒
+DEFAULT_MIN_POLL_INTERVAL = 2
+DEFAULT_MAX_POLL_INTERVAL = 30
+
+# 小于等于死区的传感器变化视为抖动, 不发布也不加快轮询
+DEFAULT_DEADBANDS = {
+    FIELD_TEMPERATURE: 0,
+    FIELD_HUMIDITY: 1,
+    FIELD_PM25: 2,
+    FIELD_VOC: 0.1
+}
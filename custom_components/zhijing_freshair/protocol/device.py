@@ -0,0 +1,749 @@
+"""Wire protocol of the freshair units, independent of Home Assistant.
+
+DeviceInterface keeps one asyncio connection per unit: framing, polling,
+commands and reconnects. Decoded reports are delivered as a DeviceState
+with a bitmask of the changed fields.
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+from array import array
+
+from .history import ReadingHistory
+from .stats import LinkStats
+from .registers import (
+    REGISTERS,
+    EXTRA_REGISTERS,
+    REPORT_DATA_START,
+    REPORT_DATA_END,
+    REPORT_DATA_LENGTH,
+    OFFSET_TEMPERATURE,
+    OFFSET_HUMIDITY,
+    OFFSET_PM25_HIGH,
+    OFFSET_PM25_LOW,
+    OFFSET_VOC,
+    OFFSET_FILTER,
+    build_decoder
+)
+from .state import (
+    FIELD_BITS,
+    FAN_MASK,
+    DeviceState,
+    REPORT_MASK,
+    DIAGNOSTIC_MASK
+)
+from .const import (
+    STATE_ON,
+    STATE_OFF,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH,
+    FIELD_STATE,
+    FIELD_MODE,
+    FIELD_SPEED,
+    FIELD_TEMPERATURE,
+    FIELD_HUMIDITY,
+    FIELD_PM25,
+    FIELD_VOC,
+    FIELD_FILTER,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_DEADBANDS
+)
+
+MSG_TYPE_GET_DATA = bytes([0x31, 0x31, 0x30, 0x32])
+MSG_TYPE_TURN_OFF = bytes([0x32, 0x31, 0x30, 0x33])
+MSG_TYPE_TURN_ON = bytes([0x32, 0x31, 0x31, 0x34])
+MSG_TYPE_SET_MODE_AUTO = bytes([0x33, 0x31, 0x31, 0x35])
+MSG_TYPE_SET_MODE_MANUALLY = bytes([0x33, 0x31, 0x32, 0x36])
+MSG_TYPE_SET_MODE_TIMING = bytes([0x33, 0x31, 0x33, 0x37])
+MSG_TYPE_SET_SPEED_OFF = bytes([0x35, 0x31, 0x30, 0x36])
+MSG_TYPE_SET_SPEED_LOW = bytes([0x35, 0x31, 0x31, 0x37])
+MSG_TYPE_SET_SPEED_MEDIUM = bytes([0x35, 0x31, 0x32, 0x38])
+MSG_TYPE_SET_SPEED_HIGH = bytes([0x35, 0x31, 0x33, 0x39])
+
+MSG_HEADER = b"\x30\x68"
+MSG_HEADER_LENGTH = 4
+MSG_MAX_LENGTH = 1024
+MSG_REPORT_LENGTH = 97  # 本地数据上报应有长度
+
+POLL_INTERVAL = 5
+POLL_BACKOFF = 1.5
+POLL_JITTER = 0.5
+COMMAND_INTERVAL = 0.3
+COMMAND_TIMEOUT = 10
+POLL_MISSES = 3
+CONNECT_TIMEOUT = 5
+PROBE_TIMEOUT = 5
+RECONNECT_MIN_INTERVAL = 1
+RECONNECT_MAX_INTERVAL = 60
+
+LINK_CONNECTING = "connecting"
+LINK_CONNECTED = "connected"
+LINK_BACKOFF = "backoff"
+LINK_CLOSED = "closed"
+
+HISTORY_FIELDS = (
+    FIELD_TEMPERATURE,
+    FIELD_HUMIDITY,
+    FIELD_PM25,
+    FIELD_VOC,
+    FIELD_FILTER
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceMessage:
+    def __init__(self):
+        self._message = bytearray([
+            # 包头
+            0x30, 0x68,
+            # 长度
+            0x00, 0x00,
+            # 间隔
+            0x00, 0x00, 0x00, 0x00,
+            # 管他是什么
+            0x55, 0x30, 0x30, 0x73, 0x30, 0x30, 0x30, 0x31, 0x30, 0x30, 0x30, 0x30, 0x73, 0x5f, 0x54, 0x55,
+            0x7e, 0x51, 0x5d, 0x55, 0x0d, 0x77, 0x55, 0x44, 0x65, 0x51, 0x42, 0x44, 0x74, 0x51, 0x44, 0x51,
+            0x16, 0x73, 0x58, 0x5e, 0x0d, 0x00, 0x16, 0x7c, 0x55, 0x5e, 0x0d, 0x07, 0x16, 0x65, 0x43, 0x55,
+            0x42, 0x72, 0x59, 0x5e, 0x51, 0x42, 0x49, 0x74, 0x51, 0x44, 0x51, 0x0d, 0xc1, 0xc1,
+            # 命令
+            0x00, 0x00, 0x00, 0x00,
+            # 结束
+            0x4e
+        ])
+
+    def build(self, message_type):
+        msg_len = len(self._message)
+        self._message[2:4] = msg_len.to_bytes(2, 'big')
+        self._message[msg_len - 5: msg_len - 1] = message_type
+        return self._message
+
+
+def build_message(message_type):
+    return bytes(DeviceMessage().build(message_type))
+
+
+# 所有命令帧在导入时构建一次
+MESSAGE_GET_DATA = build_message(MSG_TYPE_GET_DATA)
+MESSAGE_TURN_ON = build_message(MSG_TYPE_TURN_ON)
+MESSAGE_TURN_OFF = build_message(MSG_TYPE_TURN_OFF)
+
+MODE_MESSAGES = {
+    MODE_AUTO: build_message(MSG_TYPE_SET_MODE_AUTO),
+    MODE_MANUALLY: build_message(MSG_TYPE_SET_MODE_MANUALLY),
+    MODE_TIMING: build_message(MSG_TYPE_SET_MODE_TIMING)
+}
+
+SPEED_MESSAGES = {
+    SPEED_OFF: build_message(MSG_TYPE_SET_SPEED_OFF),
+    SPEED_LOW: build_message(MSG_TYPE_SET_SPEED_LOW),
+    SPEED_MEDIUM: build_message(MSG_TYPE_SET_SPEED_MEDIUM),
+    SPEED_HIGH: build_message(MSG_TYPE_SET_SPEED_HIGH)
+}
+
+
+def byte_co_decode(byte):
+    if (byte & 0x30) == 0x30:
+        byte = byte - 0x30
+    elif (byte & 0x20) == 0x20:
+        byte = byte - 0x10
+    elif (byte & 0x10) == 0x10:
+        byte = byte + 0x10
+    else:
+        byte = byte + 0x30
+    return byte
+
+
+CO_DECODE_TABLE = bytes(byte_co_decode(byte) for byte in range(256))
+
+
+decode_registers = build_decoder(REGISTERS + EXTRA_REGISTERS)
+
+
+def decode_report_data(msg):
+    """Decode the data area of a 97-byte report in one pass."""
+    return bytes(msg[REPORT_DATA_START: REPORT_DATA_END]).translate(CO_DECODE_TABLE)
+
+
+def decode_reports(frames):
+    """Decode the sensor readings of many reports at once.
+
+    frames is either a NumPy uint8 array of shape (n, 97) or an iterable of
+    97-byte reports. Returns a dict of columns keyed like the sensor states,
+    NumPy arrays for NumPy input and array.array otherwise.
+    """
+    # 不主动导入NumPy; 传入NumPy数组时它必然已导入
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(frames, np.ndarray):
+        table = np.frombuffer(CO_DECODE_TABLE, dtype=np.uint8)
+        data = table[frames[:, REPORT_DATA_START: REPORT_DATA_END]]
+        return {
+            FIELD_TEMPERATURE: data[:, OFFSET_TEMPERATURE],
+            FIELD_HUMIDITY: data[:, OFFSET_HUMIDITY],
+            FIELD_PM25: (data[:, OFFSET_PM25_HIGH].astype(np.uint16) << 8) | data[:, OFFSET_PM25_LOW],
+            FIELD_VOC: data[:, OFFSET_VOC] / 10,
+            FIELD_FILTER: data[:, OFFSET_FILTER]
+        }
+
+    data = b"".join(bytes(frame[REPORT_DATA_START: REPORT_DATA_END]) for frame in frames).translate(CO_DECODE_TABLE)
+    step = REPORT_DATA_LENGTH
+    return {
+        FIELD_TEMPERATURE: array("B", data[OFFSET_TEMPERATURE::step]),
+        FIELD_HUMIDITY: array("B", data[OFFSET_HUMIDITY::step]),
+        FIELD_PM25: array("H", (
+            (high << 8) | low for high, low in zip(data[OFFSET_PM25_HIGH::step], data[OFFSET_PM25_LOW::step]))),
+        FIELD_VOC: array("d", (voc / 10 for voc in data[OFFSET_VOC::step])),
+        FIELD_FILTER: array("B", data[OFFSET_FILTER::step])
+    }
+
+
+class FrameParser:
+    """Split the TCP byte stream into device frames.
+
+    Frames start with MSG_HEADER followed by the big-endian length of the whole
+    frame. feed() yields a memoryview for every complete frame in the buffer,
+    keeps a trailing partial frame for the next call and skips garbage up to the
+    next header. Yielded views are released before the next frame is produced,
+    copy them with bytes() if they must outlive the iteration.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self.malformed = 0
+        self.skipped = 0
+
+    def reset(self):
+        self._buffer.clear()
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        end = len(buffer)
+        view = memoryview(buffer)
+        frame = None
+        pos = 0
+        try:
+            while pos < end:
+                start = buffer.find(MSG_HEADER, pos)
+                if start < 0:
+                    # keep the last byte, it may be the first half of a header
+                    start = end - 1 if buffer[end - 1] == MSG_HEADER[0] else end
+                    self.skipped += start - pos
+                    pos = start
+                    break
+                self.skipped += start - pos
+                if end - start < MSG_HEADER_LENGTH:
+                    pos = start
+                    break
+                msg_len = (buffer[start + 2] << 8) | buffer[start + 3]
+                if msg_len < MSG_HEADER_LENGTH or msg_len > MSG_MAX_LENGTH:
+                    self.malformed += 1
+                    self.skipped += 1
+                    pos = start + 1
+                    continue
+                if end - start < msg_len:
+                    pos = start
+                    break
+                frame = view[start: start + msg_len]
+                pos = start + msg_len
+                yield frame
+                frame.release()
+        finally:
+            if frame is not None:
+                frame.release()
+            view.release()
+            del buffer[:pos]
+
+
+class PollScheduler:
+    """Adaptive poll interval.
+
+    Falls back to min_interval after a command or a significant change and grows
+    by POLL_BACKOFF for every other report, up to max_interval.
+    """
+    def __init__(self, min_interval=DEFAULT_MIN_POLL_INTERVAL, max_interval=DEFAULT_MAX_POLL_INTERVAL):
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def min_interval(self):
+        return self._min_interval
+
+    def configure(self, min_interval, max_interval):
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._interval = min_interval
+
+    def activity(self):
+        self._interval = self._min_interval
+
+    def steady(self):
+        self._interval = min(self._interval * POLL_BACKOFF, self._max_interval)
+
+
+class CommandQueue:
+    """Outbound command queue of one device.
+
+    Commands are keyed by the state they change (power, mode or speed), a new
+    command replaces a queued or unconfirmed one for the same state and takes
+    over its waiters. Commands are held while the link is down and written,
+    paced by COMMAND_INTERVAL, once it is ready. A written command waits for a
+    report that shows the requested value. The future returned by submit()
+    resolves to True when confirmed, False when the write failed, the command
+    was not confirmed within COMMAND_TIMEOUT or the queue was cleared.
+    """
+    def __init__(self, write, latency=None):
+        self._write = write
+        self._latency = latency
+        self._loop = None
+        self._ready = False
+        self._queue = {}
+        self._pending = {}
+        self._handle = None
+        self._last_write = 0
+
+    @staticmethod
+    def _resolve(futures, result):
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
+
+    def submit(self, key, value, msg):
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        futures = [future]
+        for commands in (self._queue, self._pending):
+            command = commands.pop(key, None)
+            if command is not None:
+                command[3].cancel()
+                futures.extend(command[2])
+        timeout = self._loop.call_later(COMMAND_TIMEOUT, self._expire, key)
+        self._queue[key] = [msg, value, futures, timeout, None]
+        self._schedule()
+        return future
+
+    def set_ready(self, ready):
+        self._ready = ready
+        if ready:
+            self._schedule()
+        elif self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        if self._handle is None and self._ready and len(self._queue) > 0:
+            delay = max(0, self._last_write + COMMAND_INTERVAL - self._loop.time())
+            self._handle = self._loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._handle = None
+        key = next(iter(self._queue))
+        command = self._queue.pop(key)
+        if self._write(command[0]):
+            command[4] = self._loop.time()
+            self._pending[key] = command
+        else:
+            command[3].cancel()
+            self._resolve(command[2], False)
+        self._last_write = self._loop.time()
+        self._schedule()
+
+    def _expire(self, key):
+        command = self._queue.pop(key, None) or self._pending.pop(key)
+        _LOGGER.debug(f"Command {key} = {command[1]} not confirmed in {COMMAND_TIMEOUT}s")
+        self._resolve(command[2], False)
+
+    def confirm(self, state):
+        for key in [key for key in self._pending if getattr(state, key) == self._pending[key][1]]:
+            command = self._pending.pop(key)
+            command[3].cancel()
+            if self._latency is not None:
+                self._latency.add(self._loop.time() - command[4])
+            self._resolve(command[2], True)
+
+    def clear(self):
+        self.set_ready(False)
+        for commands in (self._queue, self._pending):
+            for command in commands.values():
+                command[3].cancel()
+                self._resolve(command[2], False)
+            commands.clear()
+
+
+async def async_probe(host, port, timeout=PROBE_TIMEOUT):
+    """Check that a unit answers at host:port.
+
+    Connects, sends one MSG_TYPE_GET_DATA and waits for the report, all within
+    timeout seconds. Returns True if a report was received.
+    """
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(MESSAGE_GET_DATA)
+            parser = FrameParser()
+            while True:
+                data = await reader.read(MSG_MAX_LENGTH)
+                if not data:
+                    return False
+                for msg in parser.feed(data):
+                    if len(msg) == MSG_REPORT_LENGTH:
+                        return True
+        finally:
+            writer.close()
+
+    try:
+        return await asyncio.wait_for(exchange(), timeout)
+    except asyncio.TimeoutError:
+        _LOGGER.debug(f"Probe {host}:{port} timed out")
+    except OSError as e:
+        _LOGGER.debug(f"Probe {host}:{port} failed, {e}")
+    return False
+
+
+class DeviceInterface(asyncio.Protocol):
+    def __init__(self, host, port, on_state_changed, poll_offset=0, on_available_changed=None):
+        self._loop = None
+        self._transport = None
+        self._host = host
+        self._port = port
+        self._on_state_changed = on_state_changed
+        self._on_available_changed = on_available_changed
+        self._link_state = LINK_CLOSED
+        self._available = False
+        self._state = DeviceState()
+        self._report = DeviceState()
+        self._report_data = None
+        self._scheduler = PollScheduler()
+        self._poll_offset = poll_offset
+        self._poll_handle = None
+        self._poll_misses = 0
+        self._poll_sent = None
+        self._poll_deadbands = dict(DEFAULT_DEADBANDS)
+        self._poll_reference = {}
+        self._down_since = None
+        self._reconnect_task = None
+        self._parser = FrameParser()
+        self._stats = LinkStats()
+        self._commands = CommandQueue(self.send_command, self._stats.command_latency)
+        self._history = ReadingHistory(HISTORY_FIELDS)
+        self._capture = None
+        self._report_listener = None
+
+    @property
+    def link_state(self):
+        return self._link_state
+
+    def _set_link_state(self, link_state):
+        if link_state != self._link_state:
+            _LOGGER.debug(f"Link to {self._host}:{self._port} {self._link_state} -> {link_state}")
+            self._link_state = link_state
+
+    @property
+    def available(self):
+        return self._available
+
+    def _set_available(self, available):
+        # 连接后解码出第一个上报才算可用, 断开即不可用;
+        # 从快照恢复的状态在首次连接失败前视为可用
+        if available != self._available:
+            self._available = available
+            if self._on_available_changed is not None:
+                self._on_available_changed(available)
+
+    async def async_open(self):
+        self._loop = asyncio.get_running_loop()
+        self._set_link_state(LINK_CONNECTING)
+        result = await self._async_connect()
+        if not result and self._link_state != LINK_CLOSED:
+            self._start_reconnect()
+        return result
+
+    async def _async_connect(self):
+        try:
+            await asyncio.wait_for(
+                self._loop.create_connection(lambda: self, self._host, self._port), CONNECT_TIMEOUT)
+            result = True
+        except asyncio.TimeoutError:
+            self._stats.connect_failures += 1
+            self._stats.last_error = "connect timeout"
+            self._set_available(False)
+            result = False
+        except OSError as e:
+            _LOGGER.debug(f"Connect to {self._host}:{self._port} failed, {e}")
+            self._stats.connect_failures += 1
+            self._stats.last_error = str(e)
+            self._set_available(False)
+            result = False
+        return result
+
+    @staticmethod
+    def _backoff_delay(attempt):
+        # 指数退避, 一半固定一半随机, 避免多台设备同时重连
+        delay = min(RECONNECT_MAX_INTERVAL, RECONNECT_MIN_INTERVAL * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _async_reconnect(self):
+        attempt = 0
+        while self._link_state != LINK_CLOSED and self._transport is None:
+            self._set_link_state(LINK_BACKOFF)
+            await asyncio.sleep(self._backoff_delay(attempt))
+            attempt += 1
+            if self._link_state == LINK_BACKOFF:
+                self._set_link_state(LINK_CONNECTING)
+                await self._async_connect()
+
+    def _start_reconnect(self):
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self._loop.create_task(self._async_reconnect())
+
+    def close(self):
+        self._set_link_state(LINK_CLOSED)
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._cancel_poll()
+        self._commands.clear()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    @property
+    def poll_interval(self):
+        return self._scheduler.interval
+
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def state(self):
+        return self._state
+
+    def diagnostics(self):
+        result = self._stats.as_dict()
+        result["frames_malformed"] = self._parser.malformed
+        result["bytes_skipped"] = self._parser.skipped
+        result["link_state"] = self._link_state
+        result["poll_interval"] = self._scheduler.interval
+        result["history_samples"] = len(self._history)
+        result["state"] = self._state.as_dict()
+        return result
+
+    def set_poll_interval(self, min_interval, max_interval):
+        self._scheduler.configure(min_interval, max_interval)
+
+    def set_poll_deadband(self, field, deadband):
+        """Only a change of field by more than deadband speeds up polling."""
+        self._poll_deadbands[field] = deadband
+
+    def start_capture(self, capture):
+        self._capture = capture
+
+    def stop_capture(self):
+        capture = self._capture
+        self._capture = None
+        return capture
+
+    def set_report_listener(self, listener):
+        """Call listener(msg) with every report frame after it was processed.
+
+        msg is a view into the parser buffer, only valid during the call.
+        """
+        self._report_listener = listener
+
+    def send(self, msg):
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"Send {msg.hex()}")
+        if self._transport is None:
+            return False
+        self._transport.write(msg)
+        self._stats.bytes_out += len(msg)
+        self._stats.frames_sent += 1
+        if self._capture is not None:
+            self._capture.sent(msg)
+        return True
+
+    def send_command(self, msg):
+        result = self.send(msg)
+        self._poll_soon()
+        return result
+
+    def _submit(self, key, value, msg):
+        # 断线重连期间命令排队等待, 已关闭或无效命令立即失败
+        if msg is None or self._link_state == LINK_CLOSED:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        return self._commands.submit(key, value, msg)
+
+    def set_mode(self, mode):
+        return self._submit(FIELD_MODE, mode, MODE_MESSAGES.get(mode))
+
+    def set_speed(self, speed):
+        return self._submit(FIELD_SPEED, speed, SPEED_MESSAGES.get(speed))
+
+    def turn_on(self):
+        return self._submit(FIELD_STATE, STATE_ON, MESSAGE_TURN_ON)
+
+    def turn_off(self):
+        return self._submit(FIELD_STATE, STATE_OFF, MESSAGE_TURN_OFF)
+
+    def read_state_message(self, msg, now=None):
+        # 解码到复用的对象中; 数据区与上一帧相同时沿用上次的解码结果
+        # now为上报时间(单调时钟), 回放时使用抓包中的时间戳
+        data = decode_report_data(msg)
+        report = self._report
+        if data != self._report_data:
+            self._report_data = data
+            decode_registers(data, report)
+        self._history.add(
+            time.monotonic() if now is None else now,
+            report.temperature, report.humidity, report.pm2_5, report.voc, report.filter)
+        return report
+
+    def snapshot(self):
+        """Return the last decoded state as a JSON-serializable dict, None before the first report."""
+        if self._state.state is None:
+            return None
+        return self._state.as_dict(REPORT_MASK)
+
+    def restore(self, snapshot):
+        """Prime the state from a snapshot().
+
+        The restored state counts as available until a connect attempt fails or
+        the link is lost, so entities keep their values across a restart and
+        only the fields that differ in the first report change.
+        """
+        self._state.update(snapshot, REPORT_MASK)
+        self._available = self._state.state is not None
+
+    def _schedule_poll(self, delay=None):
+        if delay is None:
+            delay = self._scheduler.interval
+        self._poll_handle = self._loop.call_later(delay, self._poll)
+
+    def _cancel_poll(self):
+        if self._poll_handle is not None:
+            self._poll_handle.cancel()
+            self._poll_handle = None
+
+    def _poll_soon(self):
+        # 命令发出或状态变化后尽快再次查询; 加随机抖动, 避免群控命令后所有设备同时轮询
+        self._scheduler.activity()
+        delay = self._scheduler.min_interval * random.uniform(1, 1 + POLL_JITTER)
+        if self._poll_handle is not None and self._poll_handle.when() - self._loop.time() > delay:
+            self._poll_handle.cancel()
+            self._schedule_poll(delay)
+
+    def _significant(self, changed):
+        # 与上次加快轮询时的值比较, 缓慢漂移最终也会触发
+        result = False
+        state = self._state
+        for field, deadband in self._poll_deadbands.items():
+            if changed & FIELD_BITS[field]:
+                value = getattr(state, field)
+                reference = self._poll_reference.get(field)
+                if reference is None or round(abs(value - reference), 6) > deadband:
+                    self._poll_reference[field] = value
+                    result = True
+        return result
+
+    def _poll(self):
+        if self._poll_misses >= POLL_MISSES:
+            # 连接半开, 设备已不再应答
+            _LOGGER.debug(f"No report from {self._host}:{self._port} in {POLL_MISSES} polls")
+            self._poll_handle = None
+            self._transport.abort()
+            return
+        self._poll_misses += 1
+        if self.send(MESSAGE_GET_DATA):
+            self._poll_sent = self._loop.time()
+        self._schedule_poll()
+
+    def connection_made(self, transport):
+        if self._link_state == LINK_CLOSED:
+            transport.close()
+            return
+        self._transport = transport
+        self._set_link_state(LINK_CONNECTED)
+        if self._down_since is not None:
+            self._stats.reconnects += 1
+            self._stats.reconnect_time.add(self._loop.time() - self._down_since)
+            self._down_since = None
+        self._parser.reset()
+        self._poll_misses = 0
+        self._poll_sent = None
+        self._schedule_poll(self._poll_offset)
+        self._commands.set_ready(True)
+
+    def connection_lost(self, exc):
+        _LOGGER.debug(f"Connection to {self._host}:{self._port} lost, {exc}")
+        if exc is not None:
+            self._stats.last_error = str(exc)
+        self._transport = None
+        self._cancel_poll()
+        self._commands.set_ready(False)
+        if self._link_state != LINK_CLOSED:
+            self._down_since = self._loop.time()
+            self._set_available(False)
+            self._start_reconnect()
+
+    def data_received(self, data):
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"Received {data.hex()}")
+        self._stats.bytes_in += len(data)
+        for msg in self._parser.feed(data):
+            self._stats.frames_received += 1
+            if self._capture is not None:
+                self._capture.received(msg)
+            if len(msg) == MSG_REPORT_LENGTH:
+                self.process_report(msg)
+            else:
+                self._stats.frames_dropped += 1
+                _LOGGER.debug(f"Ignored frame with length {len(msg)}")
+
+    def process_report(self, msg, now=None):
+        self._poll_misses = 0
+        if self._poll_sent is not None:
+            self._stats.poll_rtt.add(self._loop.time() - self._poll_sent)
+            self._poll_sent = None
+        report = self.read_state_message(msg, now)
+        if not self._available:
+            self._set_available(True)
+        changed = self._state.merge(report, REPORT_MASK)
+        self._commands.confirm(self._state)
+        if changed & FAN_MASK or (changed and self._significant(changed)):
+            self._poll_soon()
+        else:
+            self._scheduler.steady()
+        self._diagnostic_state(report)
+        changed |= self._state.merge(report, DIAGNOSTIC_MASK)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(f"state = {self._state.as_dict()}, changed = {changed:#x}")
+        if changed:
+            self._on_state_changed(self._state, changed)
+        if self._report_listener is not None:
+            self._report_listener(msg)
+
+    def _diagnostic_state(self, report):
+        report.poll_interval = round(self._scheduler.interval, 1)
+        last = self._stats.poll_rtt.last
+        report.poll_rtt = round(last * 1000) if last is not None else None
+        report.reconnects = self._stats.reconnects
+        report.frames_dropped = self._stats.frames_dropped + self._parser.malformed
@@ -0,0 +1,133 @@
+"""Protocol benchmarks against local fake devices.
+
+Run from the integration directory:
+
+    python -m protocol.device_benchmark --devices 20
+
+Decode and command round trip are also tracked as pytest-benchmark tests in
+tests/test_benchmark.py.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from .const import (
+    SPEED_LOW,
+    SPEED_HIGH
+)
+from .device import (
+    DeviceInterface,
+    decode_reports,
+    LINK_CONNECTED
+)
+from .fake_device import FakeDevice
+
+
+def on_state_changed(state, changed):
+    pass
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (f"n={len(samples)} mean={statistics.mean(samples) * 1000:.2f}ms "
+            f"p50={samples[len(samples) // 2] * 1000:.2f}ms max={samples[-1] * 1000:.2f}ms")
+
+
+def bench_decode(frames):
+    device = FakeDevice()
+    reports = []
+    for i in range(frames):
+        device.pm2_5 = i % 200
+        reports.append(device.report())
+    stream = b"".join(reports)
+
+    interface = DeviceInterface("127.0.0.1", 0, on_state_changed)
+    start = time.perf_counter()
+    for pos in range(0, len(stream), 1024):
+        interface.data_received(stream[pos: pos + 1024])
+    elapsed = time.perf_counter() - start
+    print(f"stream decode: {frames / elapsed:,.0f} frames/s")
+
+    start = time.perf_counter()
+    decode_reports(reports)
+    elapsed = time.perf_counter() - start
+    print(f"batch decode: {frames / elapsed:,.0f} frames/s")
+
+
+async def async_open_devices(count, min_poll_interval):
+    devices = []
+    interfaces = []
+    for _ in range(count):
+        device = FakeDevice()
+        await device.async_start()
+        interface = DeviceInterface(device.host, device.port, on_state_changed)
+        interface.set_poll_interval(min_poll_interval, min_poll_interval * 10)
+        devices.append(device)
+        interfaces.append(interface)
+    await asyncio.gather(*[interface.async_open() for interface in interfaces])
+    return devices, interfaces
+
+
+async def async_bench_commands(interfaces, rounds):
+    samples = []
+    failed = 0
+
+    async def timed(future):
+        start = time.perf_counter()
+        result = await future
+        samples.append(time.perf_counter() - start)
+        return result
+
+    for i in range(rounds):
+        speed = SPEED_HIGH if i % 2 == 0 else SPEED_LOW
+        results = await asyncio.gather(*[
+            timed(interface.set_speed(speed)) for interface in interfaces])
+        failed += results.count(False)
+    print(f"command round trip: {summary(samples)} failed={failed}")
+
+
+async def async_bench_reconnect(devices, interfaces):
+    samples = []
+
+    async def wait_connected(interface, start):
+        while interface.link_state == LINK_CONNECTED:
+            await asyncio.sleep(0.001)
+        while interface.link_state != LINK_CONNECTED:
+            await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for device in devices:
+        device.disconnect()
+    await asyncio.gather(*[wait_connected(interface, start) for interface in interfaces])
+    print(f"reconnect: {summary(samples)}")
+
+
+async def async_bench_devices(count, rounds, min_poll_interval):
+    print(f"--- {count} device(s)")
+    devices, interfaces = await async_open_devices(count, min_poll_interval)
+    try:
+        await async_bench_commands(interfaces, rounds)
+        await async_bench_reconnect(devices, interfaces)
+    finally:
+        for interface in interfaces:
+            interface.close()
+        for device in devices:
+            await device.async_stop()
+
+
+async def main(args):
+    bench_decode(args.frames)
+    counts = sorted({1, args.devices})
+    for count in counts:
+        await async_bench_devices(count, args.rounds, args.min_poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zhijing freshair protocol benchmarks")
+    parser.add_argument("--devices", type=int, default=10, help="number of simulated devices")
+    parser.add_argument("--frames", type=int, default=100000, help="reports to decode")
+    parser.add_argument("--rounds", type=int, default=20, help="command rounds per device")
+    parser.add_argument("--min-poll-interval", type=float, default=0.05, help="seconds")
+    asyncio.run(main(parser.parse_args()))
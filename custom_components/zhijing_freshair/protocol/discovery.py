@@ -0,0 +1,61 @@
+"""Find freshair units on the LAN.
+
+Every address of a network is probed with async_probe() on the device port by
+a fixed pool of DISCOVERY_CONCURRENCY workers, so a /24 sweep takes a few probe
+timeouts.
+
+Scan from the integration directory:
+
+    python -m protocol.discovery 192.168.1.0/24
+"""
+import argparse
+import asyncio
+import ipaddress
+import time
+
+from .const import DEFAULT_PORT
+from .device import async_probe
+
+DISCOVERY_CONCURRENCY = 64
+DISCOVERY_TIMEOUT = 1
+DISCOVERY_MAX_HOSTS = 65536
+
+
+async def async_scan(network, port=DEFAULT_PORT, concurrency=DISCOVERY_CONCURRENCY, timeout=DISCOVERY_TIMEOUT,
+                     max_hosts=DISCOVERY_MAX_HOSTS):
+    """Return the addresses in network that answered with a report, in address order.
+
+    Raises ValueError if network is not a valid network or has more than
+    max_hosts addresses.
+    """
+    network = ipaddress.ip_network(network, strict=False)
+    if network.num_addresses > max_hosts:
+        raise ValueError(f"{network} is too large to scan")
+    addresses = network.hosts()
+    found = []
+
+    async def worker():
+        # 共享同一个地址迭代器, 协程数固定为concurrency
+        for address in addresses:
+            if await async_probe(str(address), port, timeout):
+                found.append(address)
+
+    await asyncio.gather(*[worker() for _ in range(min(concurrency, network.num_addresses))])
+    return [str(address) for address in sorted(found)]
+
+
+async def main(args):
+    start = time.perf_counter()
+    hosts = await async_scan(args.network, args.port, args.concurrency, args.timeout)
+    for host in hosts:
+        print(f"{host}:{args.port}")
+    print(f"found {len(hosts)} device(s) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan a network for Zhijing freshair units")
+    parser.add_argument("network", help="network to scan, e.g. 192.168.1.0/24")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--concurrency", type=int, default=DISCOVERY_CONCURRENCY, help="probes in flight")
+    parser.add_argument("--timeout", type=float, default=DISCOVERY_TIMEOUT, help="seconds per probe")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+
+from .device import (
+    FrameParser,
+    byte_co_decode,
+    MSG_HEADER,
+    MSG_REPORT_LENGTH,
+    MSG_TYPE_GET_DATA,
+    MSG_TYPE_TURN_OFF,
+    MSG_TYPE_TURN_ON,
+    MSG_TYPE_SET_MODE_AUTO,
+    MSG_TYPE_SET_MODE_MANUALLY,
+    MSG_TYPE_SET_MODE_TIMING,
+    MSG_TYPE_SET_SPEED_OFF,
+    MSG_TYPE_SET_SPEED_LOW,
+    MSG_TYPE_SET_SPEED_MEDIUM,
+    MSG_TYPE_SET_SPEED_HIGH
+)
+from .registers import (
+    REPORT_DATA_START,
+    REPORT_DATA_END,
+    REPORT_DATA_LENGTH,
+    OFFSET_POWER,
+    OFFSET_MODE,
+    OFFSET_SPEED,
+    OFFSET_TEMPERATURE,
+    OFFSET_HUMIDITY,
+    OFFSET_PM25_HIGH,
+    OFFSET_PM25_LOW,
+    OFFSET_VOC,
+    OFFSET_FILTER
+)
+
+# byte_co_decode的逆运算
+CO_ENCODE_TABLE = {byte_co_decode(byte): byte for byte in range(255, -1, -1)}
+
+COMMANDS = {
+    MSG_TYPE_TURN_OFF: ("power", 0),
+    MSG_TYPE_TURN_ON: ("power", 1),
+    MSG_TYPE_SET_MODE_AUTO: ("mode", 1),
+    MSG_TYPE_SET_MODE_MANUALLY: ("mode", 2),
+    MSG_TYPE_SET_MODE_TIMING: ("mode", 3),
+    MSG_TYPE_SET_SPEED_OFF: ("speed", 0),
+    MSG_TYPE_SET_SPEED_LOW: ("speed", 1),
+    MSG_TYPE_SET_SPEED_MEDIUM: ("speed", 2),
+    MSG_TYPE_SET_SPEED_HIGH: ("speed", 3)
+}
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FakeDevice:
+    """In-process stand-in for a freshair unit.
+
+    Speaks the DeviceMessage framing on a local TCP port, answers
+    MSG_TYPE_GET_DATA with a 97-byte report and applies power, mode and speed
+    commands to its state.
+    """
+    def __init__(self, host="127.0.0.1", port=0):
+        self._host = host
+        self._port = port
+        self._server = None
+        self._transports = set()
+        self.power = 1
+        self.mode = 1
+        self.speed = 1
+        self.temperature = 25
+        self.humidity = 50
+        self.pm2_5 = 12
+        self.voc = 3
+        self.filter = 80
+        self.polls = 0
+        self.commands = 0
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def port(self):
+        return self._port
+
+    async def async_start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: FakeDeviceProtocol(self), self._host, self._port)
+        self._port = self._server.sockets[0].getsockname()[1]
+
+    async def async_stop(self):
+        self.disconnect()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def disconnect(self):
+        for transport in list(self._transports):
+            transport.abort()
+
+    def report(self):
+        msg = bytearray(MSG_REPORT_LENGTH)
+        msg[0:2] = MSG_HEADER
+        msg[2:4] = MSG_REPORT_LENGTH.to_bytes(2, "big")
+        msg[REPORT_DATA_START: REPORT_DATA_END] = bytes([CO_ENCODE_TABLE[0]]) * REPORT_DATA_LENGTH
+        data = {
+            OFFSET_POWER: self.power,
+            OFFSET_MODE: self.mode,
+            OFFSET_SPEED: self.speed,
+            OFFSET_TEMPERATURE: self.temperature,
+            OFFSET_HUMIDITY: self.humidity,
+            OFFSET_PM25_HIGH: self.pm2_5 >> 8,
+            OFFSET_PM25_LOW: self.pm2_5 & 0xff,
+            OFFSET_VOC: self.voc,
+            OFFSET_FILTER: self.filter
+        }
+        for offset, value in data.items():
+            msg[REPORT_DATA_START + offset] = CO_ENCODE_TABLE[value]
+        return bytes(msg)
+
+    def handle(self, msg):
+        message_type = bytes(msg[-5:-1])
+        if message_type == MSG_TYPE_GET_DATA:
+            self.polls += 1
+            return self.report()
+        command = COMMANDS.get(message_type)
+        if command is not None:
+            self.commands += 1
+            setattr(self, command[0], command[1])
+        return None
+
+
+class FakeDeviceProtocol(asyncio.Protocol):
+    def __init__(self, device):
+        self._device = device
+        self._transport = None
+        self._parser = FrameParser()
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._device._transports.add(transport)
+
+    def connection_lost(self, exc):
+        self._device._transports.discard(self._transport)
+
+    def data_received(self, data):
+        for msg in self._parser.feed(data):
+            reply = self._device.handle(msg)
+            if reply is not None:
+                self._transport.write(reply)
@@ -0,0 +1,150 @@
+from array import array
+from collections import deque
+
+HISTORY_CAPACITY = 4096
+WINDOW_MINUTE = 60
+WINDOW_HOUR = 3600
+# 样本间隔下限, 保证容量足以覆盖最长的窗口
+HISTORY_RESOLUTION = WINDOW_HOUR / (HISTORY_CAPACITY - 1)
+
+WINDOWS = {
+    "1m": WINDOW_MINUTE,
+    "1h": WINDOW_HOUR
+}
+
+
+class RollingWindow:
+    """Min, max and mean of one field over the last span seconds.
+
+    Works on sequence numbers of the history ring buffer. Samples are folded in
+    only when statistics are read: the sum incrementally and min/max with
+    monotonic deques, O(1) amortized per sample and nothing per report.
+    """
+    def __init__(self, times, values, capacity, span):
+        self._times = times
+        self._values = values
+        self._capacity = capacity
+        self._span = span
+        self._start = 0
+        self._end = 0
+        self._sum = 0.0
+        self._min = deque()
+        self._max = deque()
+
+    def update(self, seq, now, oldest):
+        """Fold in the samples before seq and drop those older than span.
+
+        oldest is the first sequence number still held by the ring buffer.
+        """
+        if self._start < oldest:
+            # 窗口中的样本在上次读取后已被覆盖, 无法再从和中减去,
+            # 从缓冲区中最旧的样本重新累计; 只在轮询接近HISTORY_RESOLUTION时发生
+            self._start = self._end = oldest
+            self._sum = 0.0
+            self._min.clear()
+            self._max.clear()
+        values = self._values
+        capacity = self._capacity
+        for index in range(self._end, seq):
+            value = values[index % capacity]
+            self._sum += value
+            while len(self._min) > 0 and values[self._min[-1] % capacity] >= value:
+                self._min.pop()
+            self._min.append(index)
+            while len(self._max) > 0 and values[self._max[-1] % capacity] <= value:
+                self._max.pop()
+            self._max.append(index)
+        self._end = seq
+        times = self._times
+        limit = now - self._span
+        while self._start < self._end and times[self._start % capacity] < limit:
+            self._sum -= values[self._start % capacity]
+            self._start += 1
+        while len(self._min) > 0 and self._min[0] < self._start:
+            self._min.popleft()
+        while len(self._max) > 0 and self._max[0] < self._start:
+            self._max.popleft()
+
+    @property
+    def count(self):
+        return self._end - self._start
+
+    def statistics(self):
+        count = self.count
+        if count == 0:
+            return None
+        capacity = self._capacity
+        return (
+            self._values[self._min[0] % capacity],
+            self._values[self._max[0] % capacity],
+            self._sum / count
+        )
+
+
+class ReadingHistory:
+    """Ring buffer of the decoded readings of every report.
+
+    Each field is an array("d") of capacity samples sharing one array of
+    monotonic timestamps. Adding a sample only stores it; rolling 1-minute and
+    1-hour statistics catch up when they are read. A sample closer than
+    HISTORY_RESOLUTION to the previous one is skipped, so the buffer always
+    spans the whole 1-hour window however fast the unit is polled.
+    """
+    def __init__(self, fields, capacity=HISTORY_CAPACITY, resolution=HISTORY_RESOLUTION):
+        self._fields = {field: index for index, field in enumerate(fields)}
+        self._capacity = capacity
+        self._resolution = resolution
+        self._times = array("d", bytes(8 * capacity))
+        self._values = [array("d", bytes(8 * capacity)) for _ in fields]
+        self._seq = 0
+        self._last = None
+        self._windows = [
+            {name: RollingWindow(self._times, values, capacity, span) for name, span in WINDOWS.items()}
+            for values in self._values
+        ]
+
+    def __len__(self):
+        return min(self._seq, self._capacity)
+
+    def add(self, now, *readings):
+        if self._last is not None and now - self._last < self._resolution:
+            return
+        self._last = now
+        pos = self._seq % self._capacity
+        self._times[pos] = now
+        for values, value in zip(self._values, readings):
+            values[pos] = value
+        self._seq += 1
+
+    def statistics(self, field, now=None):
+        """Return {"min_1m": ..., "max_1m": ..., "mean_1m": ..., ...} of a field.
+
+        now defaults to the time of the latest sample.
+        """
+        index = self._fields.get(field)
+        if index is None:
+            return None
+        if self._seq == 0:
+            return {}
+        if now is None:
+            now = self._last
+        result = {}
+        for name, window in self._windows[index].items():
+            window.update(self._seq, now, self._seq - self._capacity)
+            statistics = window.statistics()
+            if statistics is not None:
+                result[f"min_{name}"] = statistics[0]
+                result[f"max_{name}"] = statistics[1]
+                result[f"mean_{name}"] = round(statistics[2], 2)
+        return result
+
+    def samples(self, field, since=0):
+        """Return the buffered (time, value) pairs of a field, oldest first."""
+        index = self._fields[field]
+        values = self._values[index]
+        result = []
+        for seq in range(max(0, self._seq - self._capacity), self._seq):
+            pos = seq % self._capacity
+            if self._times[pos] >= since:
+                result.append((self._times[pos], values[pos]))
+        return result
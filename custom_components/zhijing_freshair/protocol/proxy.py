@@ -0,0 +1,175 @@
+"""Share one device session with several local clients.
+
+Run from the integration directory:
+
+    python -m protocol.proxy 192.168.1.126 --listen-port 9600
+"""
+import argparse
+import asyncio
+import logging
+
+from .const import (
+    DEFAULT_PORT,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH
+)
+from .device import (
+    DeviceInterface,
+    FrameParser,
+    MSG_TYPE_GET_DATA,
+    MSG_TYPE_TURN_OFF,
+    MSG_TYPE_TURN_ON,
+    MSG_TYPE_SET_MODE_AUTO,
+    MSG_TYPE_SET_MODE_MANUALLY,
+    MSG_TYPE_SET_MODE_TIMING,
+    MSG_TYPE_SET_SPEED_OFF,
+    MSG_TYPE_SET_SPEED_LOW,
+    MSG_TYPE_SET_SPEED_MEDIUM,
+    MSG_TYPE_SET_SPEED_HIGH
+)
+
+COMMANDS = {
+    MSG_TYPE_TURN_OFF: lambda interface: interface.turn_off(),
+    MSG_TYPE_TURN_ON: lambda interface: interface.turn_on(),
+    MSG_TYPE_SET_MODE_AUTO: lambda interface: interface.set_mode(MODE_AUTO),
+    MSG_TYPE_SET_MODE_MANUALLY: lambda interface: interface.set_mode(MODE_MANUALLY),
+    MSG_TYPE_SET_MODE_TIMING: lambda interface: interface.set_mode(MODE_TIMING),
+    MSG_TYPE_SET_SPEED_OFF: lambda interface: interface.set_speed(SPEED_OFF),
+    MSG_TYPE_SET_SPEED_LOW: lambda interface: interface.set_speed(SPEED_LOW),
+    MSG_TYPE_SET_SPEED_MEDIUM: lambda interface: interface.set_speed(SPEED_MEDIUM),
+    MSG_TYPE_SET_SPEED_HIGH: lambda interface: interface.set_speed(SPEED_HIGH)
+}
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceProxy:
+    """Local TCP endpoint that multiplexes clients onto one DeviceInterface.
+
+    Clients speak the device protocol. A MSG_TYPE_GET_DATA poll is answered
+    from the last report without reaching the unit, and every report of the
+    session is forwarded to all clients. Power, mode and speed commands go
+    through the session's command queue, where they are paced and merged with
+    the owner's own commands, so the unit only ever serves one poller.
+    """
+    def __init__(self, interface, host="0.0.0.0", port=DEFAULT_PORT):
+        self._interface = interface
+        self._host = host
+        self._port = port
+        self._server = None
+        self._transports = set()
+        self._report = None
+        self.polls = 0
+        self.commands = 0
+        self.frames_ignored = 0
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def clients(self):
+        return len(self._transports)
+
+    async def async_start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: ProxyClientProtocol(self), self._host, self._port)
+        self._port = self._server.sockets[0].getsockname()[1]
+        self._interface.set_report_listener(self._on_report)
+        _LOGGER.info(f"Proxy listening on {self._host}:{self._port}")
+
+    async def async_stop(self):
+        server = self._server
+        self.close()
+        if server is not None:
+            await server.wait_closed()
+
+    def close(self):
+        if self._server is not None:
+            self._interface.set_report_listener(None)
+            self._server.close()
+            self._server = None
+        for transport in list(self._transports):
+            transport.abort()
+        self._report = None
+
+    def diagnostics(self):
+        return {
+            "port": self._port,
+            "clients": len(self._transports),
+            "polls": self.polls,
+            "commands": self.commands,
+            "frames_ignored": self.frames_ignored
+        }
+
+    def _on_report(self, msg):
+        report = bytes(msg)
+        self._report = report
+        for transport in self._transports:
+            transport.write(report)
+
+    def handle(self, transport, msg):
+        message_type = bytes(msg[-5:-1])
+        if message_type == MSG_TYPE_GET_DATA:
+            self.polls += 1
+            # 设备离线时不应答, 与直连时设备无响应一致
+            if self._report is not None and self._interface.available:
+                transport.write(self._report)
+            return
+        command = COMMANDS.get(message_type)
+        if command is None:
+            self.frames_ignored += 1
+            _LOGGER.debug(f"Ignored client frame {bytes(msg).hex()}")
+            return
+        self.commands += 1
+        command(self._interface)
+
+
+class ProxyClientProtocol(asyncio.Protocol):
+    def __init__(self, proxy):
+        self._proxy = proxy
+        self._transport = None
+        self._parser = FrameParser()
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._proxy._transports.add(transport)
+        _LOGGER.debug(f"Proxy client {transport.get_extra_info('peername')} connected")
+
+    def connection_lost(self, exc):
+        self._proxy._transports.discard(self._transport)
+
+    def data_received(self, data):
+        for msg in self._parser.feed(data):
+            self._proxy.handle(self._transport, msg)
+
+
+async def main(args):
+    interface = DeviceInterface(args.host, args.port, lambda state, changed: None)
+    await interface.async_open()
+    proxy = DeviceProxy(interface, args.listen_host, args.listen_port)
+    await proxy.async_start()
+    print(f"proxying {args.host}:{args.port} on {args.listen_host}:{proxy.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await proxy.async_stop()
+        interface.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share one zhijing freshair session with several clients")
+    parser.add_argument("host", help="host of the unit")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port of the unit")
+    parser.add_argument("--listen-host", default="0.0.0.0")
+    parser.add_argument("--listen-port", type=int, default=DEFAULT_PORT)
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
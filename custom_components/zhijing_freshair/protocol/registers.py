@@ -0,0 +1,108 @@
+"""Register map of the 97-byte report.
+
+Every value the decoder produces is one Register entry: its offset in the
+data area, width in bytes (big-endian), an optional divisor and an optional
+enum. build_decoder() turns the table into a single generated function, so
+adding a field is one entry and costs one statement per report.
+"""
+from collections import namedtuple
+
+from .const import (
+    STATE_ON,
+    STATE_OFF,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH,
+    FIELD_STATE,
+    FIELD_MODE,
+    FIELD_SPEED,
+    FIELD_TEMPERATURE,
+    FIELD_HUMIDITY,
+    FIELD_PM25,
+    FIELD_VOC,
+    FIELD_FILTER
+)
+
+# 上报数据区, 整段按CO_DECODE_TABLE解码
+REPORT_DATA_START = 76
+REPORT_DATA_END = 95
+REPORT_DATA_LENGTH = REPORT_DATA_END - REPORT_DATA_START
+# 数据区内偏移
+OFFSET_POWER = 0
+OFFSET_MODE = 1
+OFFSET_SPEED = 2
+OFFSET_TEMPERATURE = 10
+OFFSET_HUMIDITY = 11
+OFFSET_PM25_HIGH = 12
+OFFSET_PM25_LOW = 13
+OFFSET_VOC = 17
+OFFSET_FILTER = 18
+
+POWER = {
+    1: STATE_ON
+}
+
+MODES = {
+    1: MODE_AUTO,
+    2: MODE_MANUALLY
+}
+
+SPEEDS = {
+    0: SPEED_OFF,
+    1: SPEED_LOW,
+    2: SPEED_MEDIUM
+}
+
+# scale: 原始值除以scale; enum: 原始值到状态的映射, 未列出的值取default
+Register = namedtuple("Register", "field offset width scale enum default", defaults=(1, None, None, None))
+
+REGISTERS = (
+    Register(FIELD_STATE, OFFSET_POWER, enum=POWER, default=STATE_OFF),
+    Register(FIELD_MODE, OFFSET_MODE, enum=MODES, default=MODE_TIMING),
+    Register(FIELD_SPEED, OFFSET_SPEED, enum=SPEEDS, default=SPEED_HIGH),
+    Register(FIELD_TEMPERATURE, OFFSET_TEMPERATURE),
+    Register(FIELD_HUMIDITY, OFFSET_HUMIDITY),
+    Register(FIELD_PM25, OFFSET_PM25_HIGH, width=2),
+    Register(FIELD_VOC, OFFSET_VOC, scale=10),
+    Register(FIELD_FILTER, OFFSET_FILTER)
+)
+
+
+def _unmapped_registers(registers):
+    # 数据区中含义未知的字节, 以原始值提供, 确认含义后移入REGISTERS
+    mapped = set()
+    for register in registers:
+        mapped.update(range(register.offset, register.offset + register.width))
+    return tuple(
+        Register(f"byte_{REPORT_DATA_START + offset}", offset)
+        for offset in range(REPORT_DATA_LENGTH) if offset not in mapped
+    )
+
+
+EXTRA_REGISTERS = _unmapped_registers(REGISTERS)
+
+
+def build_decoder(registers):
+    """Return decode(data, state) setting one attribute of state per register.
+
+    data is the decoded data area, see decode_report_data().
+    """
+    lines = ["def decode(data, state):"]
+    namespace = {}
+    for index, register in enumerate(registers):
+        expression = f"data[{register.offset}]"
+        for offset in range(register.offset + 1, register.offset + register.width):
+            expression = f"({expression} << 8 | data[{offset}])"
+        if register.scale is not None:
+            expression = f"{expression} / {register.scale}"
+        if register.enum is not None:
+            namespace[f"enum_{index}"] = register.enum
+            namespace[f"default_{index}"] = register.default
+            expression = f"enum_{index}.get({expression}, default_{index})"
+        lines.append(f"    state.{register.field} = {expression}")
+    exec(compile("\n".join(lines), f"<{__name__}>", "exec"), namespace)
+    return namespace["decode"]
@@ -0,0 +1,229 @@
+"""Soak and load test against real units or local fake devices.
+
+Opens one session per device, issues a weighted mix of commands at a target
+rate while the devices are polled at a fixed interval, and prints per-device
+throughput, command latency, poll round trip, dropped frames and reconnects.
+A command replaced by a newer one for the same state before it was confirmed
+never reaches the unit as such and is counted as superseded, not ok.
+Exits with status 1 if any device never connected or any command failed.
+
+Run from the integration directory:
+
+    python -m protocol.soak 192.168.1.126 192.168.1.127:9600 --duration 14400
+    python -m protocol.soak --simulate 50 --rate 1 --mix speed=3,mode=1,power=1
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from .const import (
+    DEFAULT_PORT,
+    STATE_ON,
+    STATE_OFF,
+    MODE_AUTO,
+    MODE_MANUALLY,
+    MODE_TIMING,
+    SPEED_OFF,
+    SPEED_LOW,
+    SPEED_MEDIUM,
+    SPEED_HIGH
+)
+from .device import DeviceInterface
+from .fake_device import FakeDevice
+from .stats import Histogram
+
+OPERATIONS = {
+    "power": (STATE_ON, STATE_OFF),
+    "mode": (MODE_AUTO, MODE_MANUALLY, MODE_TIMING),
+    "speed": (SPEED_OFF, SPEED_LOW, SPEED_MEDIUM, SPEED_HIGH)
+}
+DEFAULT_MIX = "speed=1"
+
+
+def parse_host(value):
+    host, _, port = value.partition(":")
+    return host, int(port) if port else DEFAULT_PORT
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {operation}, expected one of {list(OPERATIONS)}")
+        mix[operation] = float(weight) if weight else 1.0
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("mix needs a positive weight")
+    return mix
+
+
+def on_state_changed(state, changed):
+    pass
+
+
+def ms(value):
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+
+class SoakSession:
+    """Drives one device and accounts its commands."""
+    def __init__(self, host, port, mix, rate, fleet_latency):
+        self.name = f"{host}:{port}"
+        self.interface = DeviceInterface(host, port, on_state_changed)
+        self._operations = list(mix)
+        self._weights = list(mix.values())
+        self._rate = rate
+        self._initial = None
+        self._inflight = set()
+        # 每种操作最近一条未完成命令的future
+        self._latest = {}
+        self.latency = Histogram()
+        self._fleet_latency = fleet_latency
+        self.confirmed = 0
+        self.failed = 0
+        self.superseded = 0
+
+    def _command(self, operation, value):
+        interface = self.interface
+        if operation == "power":
+            return interface.turn_on() if value == STATE_ON else interface.turn_off()
+        if operation == "mode":
+            return interface.set_mode(value)
+        return interface.set_speed(value)
+
+    async def _async_timed(self, operation, future):
+        start = time.monotonic()
+        self._latest[operation] = future
+        result = await future
+        if self._latest.get(operation) is not future:
+            # 被同类新命令取代, 结果与耗时属于新命令
+            self.superseded += 1
+            return
+        del self._latest[operation]
+        if result:
+            self.confirmed += 1
+            latency = time.monotonic() - start
+            self.latency.add(latency)
+            self._fleet_latency.add(latency)
+        else:
+            self.failed += 1
+
+    def _issue(self):
+        state = self.interface.state
+        operation = random.choices(self._operations, self._weights)[0]
+        current = state.state if operation == "power" else getattr(state, operation)
+        # 总是请求与当前不同的值, 确保每条命令都要等设备上报确认
+        value = random.choice([value for value in OPERATIONS[operation] if value != current])
+        task = asyncio.create_task(self._async_timed(operation, self._command(operation, value)))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def async_run(self, deadline):
+        if self._rate <= 0:
+            await asyncio.sleep(max(0, deadline - time.monotonic()))
+            return
+        # 固定节拍发命令, 不等待确认; 排队中的同类命令会被新命令取代
+        period = 1 / self._rate
+        next_time = time.monotonic() + random.uniform(0, period)
+        while next_time < deadline:
+            await asyncio.sleep(max(0, next_time - time.monotonic()))
+            if self._initial is None and self.interface.state.state is not None:
+                self._initial = self.interface.state.as_dict()
+            if self.interface.available:
+                self._issue()
+            next_time += period
+
+    async def async_finish(self):
+        if len(self._inflight) > 0:
+            await asyncio.gather(*self._inflight)
+        initial = self._initial
+        if initial is not None and self.interface.available:
+            await asyncio.gather(
+                self._command("mode", initial["mode"]),
+                self._command("speed", initial["speed"]),
+                self._command("power", initial["state"]))
+        self.interface.close()
+
+    def report(self, elapsed):
+        stats = self.interface.stats
+        diagnostics = self.interface.diagnostics()
+        dropped = stats.frames_dropped + diagnostics["frames_malformed"]
+        return (f"{self.name:<21} {self.interface.link_state:<10} "
+                f"ok={self.confirmed:<6} fail={self.failed:<4} superseded={self.superseded:<4} {self.confirmed / elapsed:6.2f} cmd/s "
+                f"{stats.frames_received / elapsed:6.2f} frame/s "
+                f"cmd p50/p99={ms(self.latency.percentile(0.5))}/{ms(self.latency.percentile(0.99))}ms "
+                f"rtt p50/p99={ms(stats.poll_rtt.percentile(0.5))}/{ms(stats.poll_rtt.percentile(0.99))}ms "
+                f"dropped={dropped} reconnects={stats.reconnects}")
+
+
+def print_report(sessions, start):
+    elapsed = max(time.monotonic() - start, 1e-9)
+    print(f"--- {elapsed:.0f}s")
+    for session in sessions:
+        print(session.report(elapsed))
+    sys.stdout.flush()
+
+
+async def async_report_loop(sessions, start, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print_report(sessions, start)
+
+
+async def main(args):
+    devices = []
+    hosts = [parse_host(host) for host in args.hosts]
+    for _ in range(args.simulate):
+        device = FakeDevice()
+        await device.async_start()
+        devices.append(device)
+        hosts.append((device.host, device.port))
+    if len(hosts) == 0:
+        print("no hosts given, pass host[:port] arguments or --simulate N")
+        return 2
+
+    latency = Histogram()
+    sessions = [SoakSession(host, port, args.mix, args.rate, latency) for host, port in hosts]
+    for session in sessions:
+        session.interface.set_poll_interval(args.poll_interval, args.poll_interval)
+    opened = await asyncio.gather(*[session.interface.async_open() for session in sessions])
+    for session, result in zip(sessions, opened):
+        if not result:
+            print(f"{session.name} not connected, retrying in background")
+
+    start = time.monotonic()
+    reporter = asyncio.create_task(async_report_loop(sessions, start, args.report_interval))
+    try:
+        await asyncio.gather(*[session.async_run(start + args.duration) for session in sessions])
+    finally:
+        reporter.cancel()
+        await asyncio.gather(*[session.async_finish() for session in sessions])
+        for device in devices:
+            await device.async_stop()
+
+    print_report(sessions, start)
+    confirmed = sum(session.confirmed for session in sessions)
+    failed = sum(session.failed for session in sessions)
+    superseded = sum(session.superseded for session in sessions)
+    unreachable = sum(1 for session in sessions if session.interface.stats.frames_received == 0)
+    print(f"total: devices={len(sessions)} unreachable={unreachable} ok={confirmed} fail={failed} "
+          f"superseded={superseded} "
+          f"{confirmed / args.duration:.2f} cmd/s "
+          f"cmd p50/p99={ms(latency.percentile(0.5))}/{ms(latency.percentile(0.99))}ms")
+    return 1 if failed > 0 or unreachable > 0 else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zhijing freshair soak and load test")
+    parser.add_argument("hosts", nargs="*", metavar="host[:port]", help="units to test")
+    parser.add_argument("--simulate", type=int, default=0, help="number of local fake devices to add")
+    parser.add_argument("--duration", type=float, default=3600, help="seconds")
+    parser.add_argument("--rate", type=float, default=0.2,
+                        help="commands per second per device, 0 for polling only")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help="weighted operations, e.g. speed=3,mode=1,power=1")
+    parser.add_argument("--poll-interval", type=float, default=5, help="seconds")
+    parser.add_argument("--report-interval", type=float, default=60, help="seconds")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,120 @@
+from operator import attrgetter
+
+from .const import (
+    FIELD_STATE,
+    FIELD_MODE,
+    FIELD_SPEED,
+    FIELD_POLL_INTERVAL,
+    FIELD_POLL_RTT,
+    FIELD_RECONNECTS,
+    FIELD_FRAMES_DROPPED
+)
+from .registers import (
+    REGISTERS,
+    EXTRA_REGISTERS
+)
+
+# 字段顺序即位掩码中的位序
+REPORT_FIELDS = tuple(register.field for register in REGISTERS + EXTRA_REGISTERS)
+EXTRA_FIELDS = tuple(register.field for register in EXTRA_REGISTERS)
+DIAGNOSTIC_FIELDS = (
+    FIELD_POLL_INTERVAL,
+    FIELD_POLL_RTT,
+    FIELD_RECONNECTS,
+    FIELD_FRAMES_DROPPED
+)
+FIELDS = REPORT_FIELDS + DIAGNOSTIC_FIELDS
+
+FIELD_BITS = {field: 1 << index for index, field in enumerate(FIELDS)}
+
+
+def fields_mask(fields):
+    mask = 0
+    for field in fields:
+        mask |= FIELD_BITS[field]
+    return mask
+
+
+FAN_MASK = fields_mask((FIELD_STATE, FIELD_MODE, FIELD_SPEED))
+REPORT_MASK = fields_mask(REPORT_FIELDS)
+EXTRA_MASK = fields_mask(EXTRA_FIELDS)
+DIAGNOSTIC_MASK = fields_mask(DIAGNOSTIC_FIELDS)
+ALL_MASK = REPORT_MASK | DIAGNOSTIC_MASK
+
+_FIELD_ITEMS = tuple(FIELD_BITS.items())
+_MASKS = {}
+
+
+def _mask_fields(mask):
+    # mask中字段的(field, bit)与一次取出全部字段值的getter, 按mask缓存
+    fields = _MASKS.get(mask)
+    if fields is None:
+        items = tuple((field, bit) for field, bit in _FIELD_ITEMS if bit & mask)
+        names = [field for field, _ in items]
+        if len(names) == 1:
+            # attrgetter只取一个字段时不返回元组
+            single = attrgetter(names[0])
+            getter = lambda state: (single(state),)
+        else:
+            getter = attrgetter(*names)
+        fields = _MASKS[mask] = (items, getter)
+    return fields
+
+
+class DeviceState:
+    """Decoded state of one device, shared by the fan, the sensors and diagnostics.
+
+    Fields are slots named after FIELDS, None until known. Changes are
+    reported as bitmasks of FIELD_BITS.
+    """
+    __slots__ = FIELDS
+
+    def __init__(self):
+        for field in FIELDS:
+            setattr(self, field, None)
+
+    def diff(self, other, mask=ALL_MASK):
+        """Return the mask of the fields in mask that differ from other."""
+        items, getter = _mask_fields(mask)
+        values = getter(self)
+        others = getter(other)
+        if values == others:
+            return 0
+        changed = 0
+        for (_, bit), value, other_value in zip(items, values, others):
+            if value != other_value:
+                changed |= bit
+        return changed
+
+    def merge(self, other, mask=ALL_MASK):
+        """Copy the fields in mask from other, returns the mask of the fields that changed."""
+        items, getter = _mask_fields(mask)
+        values = getter(self)
+        others = getter(other)
+        if values == others:
+            return 0
+        changed = 0
+        for (field, bit), value, other_value in zip(items, values, others):
+            if value != other_value:
+                setattr(self, field, other_value)
+                changed |= bit
+        return changed
+
+    def set(self, field, value):
+        """Set one field, returns its bit if the value changed, otherwise 0."""
+        if value == getattr(self, field):
+            return 0
+        setattr(self, field, value)
+        return FIELD_BITS[field]
+
+    def as_dict(self, mask=ALL_MASK):
+        return {
+            field: getattr(self, field) for field, _ in _mask_fields(mask)[0]
+            if getattr(self, field) is not None
+        }
+
+    def update(self, data, mask=ALL_MASK):
+        """Set the fields in mask from an as_dict() result, unknown keys are ignored."""
+        for field, _ in _mask_fields(mask)[0]:
+            if field in data:
+                setattr(self, field, data[field])
@@ -0,0 +1,87 @@
+from bisect import bisect_left
+
+# 秒
+HISTOGRAM_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram in seconds."""
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self._bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = None
+
+    def add(self, value):
+        self.buckets[bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count > 0 else None
+
+    def percentile(self, q):
+        """Estimate the q quantile (0..1), interpolating linearly within its bucket."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.buckets):
+            if count > 0 and seen + count >= rank:
+                upper = min(self._bounds[i], self.max) if i < len(self._bounds) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            if i < len(self._bounds):
+                lower = self._bounds[i]
+        return self.max
+
+    def as_dict(self):
+        buckets = {f"le_{bound}": count for bound, count in zip(self._bounds, self.buckets)}
+        buckets[f"gt_{self._bounds[-1]}"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "last": self.last,
+            "buckets": buckets
+        }
+
+
+class LinkStats:
+    """Counters and latency histograms of one device link."""
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_received = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.last_error = None
+        self.poll_rtt = Histogram()
+        self.reconnect_time = Histogram()
+        self.command_latency = Histogram()
+
+    def as_dict(self):
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "frames_received": self.frames_received,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "last_error": self.last_error,
+            "poll_rtt": self.poll_rtt.as_dict(),
+            "reconnect_time": self.reconnect_time.as_dict(),
+            "command_latency": self.command_latency.as_dict()
+        }
@@ -1,5 +1,6 @@
 import logging
 
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity
 
 from .const import (
@@ -7,6 +8,10 @@ from .const import (
     DEVICE_CLASS_PM25,
     DEVICE_CLASS_VOC,
     DEVICE_CLASS_FILTER,
+    SENSOR_POLL_INTERVAL,
+    SENSOR_POLL_RTT,
+    SENSOR_RECONNECTS,
+    SENSOR_FRAMES_DROPPED,
     STATES_MANAGER,
     DEVICE_INFO
 )
@@ -19,6 +24,9 @@ from homeassistant.const import (
     CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
     CONCENTRATION_PARTS_PER_MILLION,
     PERCENTAGE,
+    TIME_SECONDS,
+    TIME_MILLISECONDS,
+    ENTITY_CATEGORY_DIAGNOSTIC,
     CONF_HOST
 )
 
@@ -28,6 +36,8 @@ from homeassistant.const import (
     TEMP_CELSIUS
 )
 
+from .protocol.state import EXTRA_FIELDS
+
 _LOGGER = logging.getLogger(__name__)
 
 UNITS = {
@@ -36,6 +46,8 @@ UNITS = {
     DEVICE_CLASS_PM25: CONCENTRATION_MICROGRAMS_PER_CUBIC_METER,
     DEVICE_CLASS_VOC: CONCENTRATION_PARTS_PER_MILLION,
     DEVICE_CLASS_FILTER: PERCENTAGE,
+    SENSOR_POLL_INTERVAL: TIME_SECONDS,
+    SENSOR_POLL_RTT: TIME_MILLISECONDS,
 }
 
 NAMES = {
@@ -43,18 +55,39 @@ NAMES = {
     DEVICE_CLASS_HUMIDITY: "Air Handling Unit Humidity",
     DEVICE_CLASS_PM25: "Air Handling Unit PM2.5",
     DEVICE_CLASS_VOC: "Air Handling Unit VOC",
-    DEVICE_CLASS_FILTER: "Air Handling Unit Filter"
+    DEVICE_CLASS_FILTER: "Air Handling Unit Filter",
+    SENSOR_POLL_INTERVAL: "Air Handling Unit Poll Interval",
+    SENSOR_POLL_RTT: "Air Handling Unit Poll Round Trip",
+    SENSOR_RECONNECTS: "Air Handling Unit Reconnects",
+    SENSOR_FRAMES_DROPPED: "Air Handling Unit Frames Dropped"
 }
 
 ICONS = {
     DEVICE_CLASS_PM25: "mdi:air-humidifier",
     DEVICE_CLASS_VOC: "mdi:air-humidifier",
     DEVICE_CLASS_FILTER: "mdi:air-filter",
+    SENSOR_POLL_INTERVAL: "mdi:timer-outline",
+    SENSOR_POLL_RTT: "mdi:timer-sync-outline",
+    SENSOR_RECONNECTS: "mdi:lan-connect",
+    SENSOR_FRAMES_DROPPED: "mdi:lan-disconnect",
 }
 
+DIAGNOSTIC_TYPES = [
+    SENSOR_POLL_INTERVAL, SENSOR_POLL_RTT, SENSOR_RECONNECTS, SENSOR_FRAMES_DROPPED
+]
+
+# 链路诊断传感器默认禁用, 需要时在实体设置中启用
+DISABLED_TYPES = [
+    SENSOR_POLL_INTERVAL, SENSOR_POLL_RTT, SENSOR_RECONNECTS, SENSOR_FRAMES_DROPPED
+]
+
+STATISTICS_TYPES = [
+    DEVICE_CLASS_TEMPERATURE, DEVICE_CLASS_HUMIDITY, DEVICE_CLASS_PM25, DEVICE_CLASS_VOC
+]
+
 SENSOR_TYPES = [
     DEVICE_CLASS_TEMPERATURE, DEVICE_CLASS_HUMIDITY, DEVICE_CLASS_PM25, DEVICE_CLASS_VOC, DEVICE_CLASS_FILTER
-]
+] + DIAGNOSTIC_TYPES
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
@@ -66,6 +99,15 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     async_add_entities(sensors)
 
+    @callback
+    def async_add_fields(fields):
+        # 寄存器表中未预定义实体的字段, 首次解码出值时再创建
+        async_add_entities([
+            FreshairSensor(states_manager, field, config_entry.data[CONF_HOST]) for field in fields
+        ])
+
+    states_manager.set_field_listener(async_add_fields)
+
 
 class FreshairSensor(Entity):
     def __init__(self, states_manager, sensor_type, host):
@@ -73,10 +115,14 @@ class FreshairSensor(Entity):
         self._unique_id = f"{DOMAIN}.{host}_{sensor_type}"
         self.entity_id = self._unique_id
         self._sensor_type = sensor_type
+        self._states_manager = states_manager
         self._device_info = DEVICE_INFO
         self._device_info["identifiers"] = {(DOMAIN, host)}
 
-        states_manager.add_sensor_update(sensor_type, self.update_status)
+        states_manager.add_sensor(sensor_type, self)
+
+    async def async_will_remove_from_hass(self):
+        self._states_manager.remove_sensor(self._sensor_type)
 
     @property
     def state(self):
@@ -90,13 +136,27 @@ class FreshairSensor(Entity):
     def should_poll(self):
         return False
 
+    @property
+    def available(self):
+        return self._states_manager.available
+
     @property
     def device_class(self):
-        return self._sensor_type
+        return None if self._sensor_type in DIAGNOSTIC_TYPES or self._sensor_type in EXTRA_FIELDS \
+            else self._sensor_type
+
+    @property
+    def entity_category(self):
+        return ENTITY_CATEGORY_DIAGNOSTIC if self._sensor_type in DIAGNOSTIC_TYPES or \
+            self._sensor_type in EXTRA_FIELDS else None
+
+    @property
+    def entity_registry_enabled_default(self):
+        return self._sensor_type not in DISABLED_TYPES and self._sensor_type not in EXTRA_FIELDS
 
     @property
     def name(self):
-        return NAMES.get(self._sensor_type)
+        return NAMES.get(self._sensor_type, f"Air Handling Unit {self._sensor_type.replace('_', ' ').title()}")
 
     @property
     def unique_id(self):
@@ -110,9 +170,15 @@ class FreshairSensor(Entity):
     def icon(self):
         return ICONS.get(self._sensor_type)
 
+    @property
+    def extra_state_attributes(self):
+        # 1分钟与1小时内的最小/最大/平均值
+        if self._sensor_type in STATISTICS_TYPES:
+            return self._states_manager.statistics(self._sensor_type)
+        return None
+
     def update_status(self, state):
+        if state == self._state:
+            return False
         self._state = state
-        try:
-            self.schedule_update_ha_state()
-        except Exception:
-            pass
+        return True
@@ -0,0 +1,49 @@
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_KEY = f"{DOMAIN}.snapshot"
+STORAGE_VERSION = 1
+# 秒, 状态变化后最迟多久写入
+SNAPSHOT_SAVE_DELAY = 60
+
+
+class SnapshotStore:
+    """Last known state of every device, kept across restarts.
+
+    State changes only mark the store dirty. The snapshots are collected and
+    written through Store.async_delay_save() at most once per
+    SNAPSHOT_SAVE_DELAY, and once more when Home Assistant stops.
+    """
+    def __init__(self, hass, hub):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._hub = hub
+        self._snapshots = {}
+        self._scheduled = False
+
+    async def async_load(self):
+        self._snapshots = await self._store.async_load() or {}
+
+    def get(self, host):
+        return self._snapshots.get(host)
+
+    def changed(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self._store.async_delay_save(self._collect, SNAPSHOT_SAVE_DELAY)
+
+    def remove(self, host):
+        if self._snapshots.pop(host, None) is not None:
+            self.changed()
+
+    def update(self):
+        """Take the current snapshot of every device of the hub."""
+        for host in self._hub.hosts:
+            snapshot = self._hub.get(host).snapshot()
+            if snapshot is not None:
+                self._snapshots[host] = snapshot
+
+    def _collect(self):
+        self._scheduled = False
+        self.update()
+        return self._snapshots
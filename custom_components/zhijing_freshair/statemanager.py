@@ -1,361 +1,328 @@
-import socket
-import threading
-import time
+import asyncio
 import logging
-import binascii
-
-from .const import (
-    DEVICE_CLASS_PM25,
-    DEVICE_CLASS_VOC,
-    DEVICE_CLASS_FILTER,
-    MODE_AUTO,
-    MODE_MANUALLY,
-    MODE_TIMING,
-    SPEED_OFF,
-    SPEED_LOW,
-    SPEED_MEDIUM,
-    SPEED_HIGH,
-    ATTR_SPEED
-)
+import time
 
-from homeassistant.const import (
-    DEVICE_CLASS_HUMIDITY,
-    DEVICE_CLASS_TEMPERATURE,
-    STATE_ON,
-    STATE_OFF,
-    ATTR_MODE,
-    ATTR_STATE,
-    ATTR_ICON
+from .protocol.device import DeviceInterface, HISTORY_FIELDS
+from .protocol.proxy import DeviceProxy
+from .protocol.state import (
+    DeviceState,
+    FAN_MASK,
+    FIELD_BITS,
+    REPORT_MASK,
+    EXTRA_MASK,
+    EXTRA_FIELDS
 )
 
-MSG_TYPE_GET_DATA = bytearray([0x31, 0x31, 0x30, 0x32])
-MSG_TYPE_TURN_OFF = bytearray([0x32, 0x31, 0x30, 0x33])
-MSG_TYPE_TURN_ON = bytearray([0x32, 0x31, 0x31, 0x34])
-MSG_TYPE_SET_MODE_AUTO = bytearray([0x33, 0x31, 0x31, 0x35])
-MSG_TYPE_SET_MODE_MANUALLY = bytearray([0x33, 0x31, 0x32, 0x36])
-MSG_TYPE_SET_MODE_TIMING = bytearray([0x33, 0x31, 0x33, 0x37])
-MSG_TYPE_SET_SPEED_OFF = bytearray([0x35, 0x31, 0x30, 0x36])
-MSG_TYPE_SET_SPEED_LOW = bytearray([0x35, 0x31, 0x31, 0x37])
-MSG_TYPE_SET_SPEED_MEDIUM = bytearray([0x35, 0x31, 0x32, 0x38])
-MSG_TYPE_SET_SPEED_HIGH = bytearray([0x35, 0x31, 0x33, 0x39])
-
-ICON_ON = "mdi:fan"
-ICON_OFF = "mdi:fan-off"
+# 统计属性的刷新周期, 数值被死区过滤、实体长时间不写入时统计也保持更新
+STATISTICS_INTERVAL = 60
 
 _LOGGER = logging.getLogger(__name__)
 
 
-class DeviceMessage:
-    def __init__(self):
-        self._message = bytearray([
-            # 包头
-            0x30, 0x68,
-            # 长度
-            0x00, 0x00,
-            # 间隔
-            0x00, 0x00, 0x00, 0x00,
-            # 管他是什么
-            0x55, 0x30, 0x30, 0x73, 0x30, 0x30, 0x30, 0x31, 0x30, 0x30, 0x30, 0x30, 0x73, 0x5f, 0x54, 0x55,
-            0x7e, 0x51, 0x5d, 0x55, 0x0d, 0x77, 0x55, 0x44, 0x65, 0x51, 0x42, 0x44, 0x74, 0x51, 0x44, 0x51,
-            0x16, 0x73, 0x58, 0x5e, 0x0d, 0x00, 0x16, 0x7c, 0x55, 0x5e, 0x0d, 0x07, 0x16, 0x65, 0x43, 0x55,
-            0x42, 0x72, 0x59, 0x5e, 0x51, 0x42, 0x49, 0x74, 0x51, 0x44, 0x51, 0x0d, 0xc1, 0xc1,
-            # 命令
-            0x00, 0x00, 0x00, 0x00,
-            # 结束
-            0x4e
-        ])
-
-    def build(self, message_type):
-        msg_len = len(self._message)
-        self._message[2:4] = msg_len.to_bytes(2, 'big')
-        self._message[msg_len - 5: msg_len - 1] = message_type
-        return self._message
-
-
-def byte_co_decode(byte):
-    if (byte & 0x30) == 0x30:
-        byte = byte - 0x30
-    elif (byte & 0x20) == 0x20:
-        byte = byte - 0x10
-    elif (byte & 0x10) == 0x10:
-        byte = byte + 0x10
-    else:
-        byte = byte + 0x30
-    return byte
-
-
-class Timer(threading.Thread):
-    def __init__(self, interval, function):
-        threading.Thread.__init__(self)
-        self._intreval = interval
-        self._function = function
-        self._finished = threading.Event()
-
-    def cancel(self):
-        self._finished.set()
-
-    def run(self):
-        while not self._finished.is_set():
-            self._finished.wait(self._intreval)
-            if not self._finished.is_set():
-                self._function()
-        self._finished.set()
-
-
-class DeviceInterface(threading.Thread):
-    def __init__(self, host, port, on_fan_state_changed, on_sensor_state_changed):
-        threading.Thread.__init__(self)
-        self._lock = threading.Lock()
-        self._socket = None
-        self._host = host
-        self._port = port
-        self._on_fan_state_changed = on_fan_state_changed
-        self._on_sensor_state_changed = on_sensor_state_changed
-        self._is_run = False
-        self._is_on = None
-        self._mode = None
-        self._speed = None
-        self._pm_25 = None
-        self._voc = None
-        self._temperature = None
-        self._humidity = None
-        self._filter = None
-        self._timer = None
-        request = DeviceMessage()
-        self._get_data = request.build(MSG_TYPE_GET_DATA)
-
-    def open(self, start_thread):
-        with self._lock:
-            if self._socket is None:
-                try:
-                    self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self._socket.settimeout(3)
-                    self._socket.connect((self._host, self._port))
-                    self._timer = Timer(5, self.send_timer)
-                    self._timer.start()
-                    result = True
-                except socket.timeout:
-                    result = False
-                except socket.error:
-                    result = False
-            else:
-                result = True
-            if start_thread:
-                self._is_run = True
-                threading.Thread.start(self)
-        return result
-
-    def close(self):
-        with self._lock:
-            if self._timer is not None:
-                self._timer.cancel()
-                self._timer = None
-            if self._socket is not None:
-                if self._is_run:
-                    self._is_run = False
-                self._socket.close()
-                self._socket = None
-
-    def send(self, msg):
-        _LOGGER.debug(f"Send {binascii.hexlify(msg)}")
-        with self._lock:
-            try:
-                self._socket.send(msg)
-            except socket.timeout:
-                pass
-            except socket.error:
-                pass
-
-    def set_mode(self, mode):
-        request = DeviceMessage()
-        msg = None
-        if mode == MODE_AUTO:
-            msg = request.build(MSG_TYPE_SET_MODE_AUTO)
-        elif mode == MODE_MANUALLY:
-            msg = request.build(MSG_TYPE_SET_MODE_MANUALLY)
-        elif mode == MODE_TIMING:
-            msg = request.build(MSG_TYPE_SET_MODE_TIMING)
-        if msg is not None:
-            self.send(msg)
-
-    def set_speed(self, speed):
-        request = DeviceMessage()
-        msg = None
-        if speed == SPEED_OFF:
-            msg = request.build(MSG_TYPE_SET_SPEED_OFF)
-        elif speed == SPEED_LOW:
-            msg = request.build(MSG_TYPE_SET_SPEED_LOW)
-        elif speed == SPEED_MEDIUM:
-            msg = request.build(MSG_TYPE_SET_SPEED_MEDIUM)
-        elif speed == SPEED_HIGH:
-            msg = request.build(MSG_TYPE_SET_SPEED_HIGH)
-        if msg is not None:
-            self.send(msg)
-
-    def turn_on(self):
-        request = DeviceMessage()
-        msg = request.build(MSG_TYPE_TURN_ON)
-        self.send(msg)
+class SensorFilter:
+    """Deadband and rate limit for one sensor.
+
+    A value within deadband of the last published value is dropped, a larger
+    change arriving less than min_interval after the last publish is held in
+    pending until due. Every value not published immediately is counted in
+    suppressed.
+    """
+    def __init__(self, deadband=0, min_interval=0):
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self.pending = None
+        self.suppressed = 0
+        self._value = None
+        self._published = 0
+
+    @property
+    def due(self):
+        return self._published + self.min_interval
+
+    def offer(self, value, now):
+        if self._value is not None and round(abs(value - self._value), 6) <= self.deadband:
+            self.pending = None
+            self.suppressed += 1
+            return False
+        if now < self.due:
+            self.pending = value
+            self.suppressed += 1
+            return False
+        self.publish(value, now)
+        return True
 
-    def turn_off(self):
-        request = DeviceMessage()
-        msg = request.build(MSG_TYPE_TURN_OFF)
-        self.send(msg)
-
-    def read_state_message(self, msg):
-        # get fan states
-        is_on = STATE_ON if byte_co_decode(msg[76]) == 1 else STATE_OFF
-        icon = ICON_ON if is_on == STATE_ON else ICON_OFF
-        mode = byte_co_decode(msg[77])
-        if mode == 1:
-            mode = MODE_AUTO
-        elif mode == 2:
-            mode = MODE_MANUALLY
-        else:
-            mode = MODE_TIMING
-
-        speed = byte_co_decode(msg[78])
-        if speed == 0:
-            speed = SPEED_OFF
-        elif speed == 1:
-            speed = SPEED_LOW
-        elif speed == 2:
-            speed = SPEED_MEDIUM
-        else:
-            speed = SPEED_HIGH
-        # get sensor states
-        temperature = byte_co_decode(msg[86])
-        humidity = byte_co_decode(msg[87])
-        pm2_5 = (byte_co_decode(msg[88]) << 8) + byte_co_decode(msg[89])
-        voc = byte_co_decode(msg[93]) / 10
-        filter_state = byte_co_decode(msg[94])
-
-        fan_state = {}
-        sensor_state = {}
-
-        if is_on != self._is_on:
-            fan_state[ATTR_ICON] = icon
-            fan_state[ATTR_STATE] = self._is_on = is_on
-        if mode != self._mode:
-            fan_state[ATTR_MODE] = self._mode = mode
-        if speed != self._speed:
-            fan_state[ATTR_SPEED] = self._speed = speed
-        if temperature != self._temperature:
-            sensor_state[DEVICE_CLASS_TEMPERATURE] = self._temperature = temperature
-
-        if humidity != self._humidity:
-            sensor_state[DEVICE_CLASS_HUMIDITY] = self._humidity = humidity
-        if pm2_5 != self._pm_25:
-            sensor_state[DEVICE_CLASS_PM25] = self._pm_25 = pm2_5
-        if voc != self._voc:
-            sensor_state[DEVICE_CLASS_VOC] = self._voc = voc
-        if filter_state != self._filter:
-            sensor_state[DEVICE_CLASS_FILTER] = self._filter = filter_state
-
-        return fan_state, sensor_state
-
-    def send_timer(self):
-        self.send(self._get_data)
-
-    def run(self):
-        while self._is_run:
-            with self._lock:
-                while self._socket is None:
-                    try:
-                        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        self._socket.settimeout(5)
-                        self._socket.connect((self._host, self._port))
-                    except socket.timeout:
-                        self._socket.close()
-                        self._socket = None
-                        time.sleep(3)
-                    except socket.error:
-                        self._socket.close()
-                        self._socket = None
-                        time.sleep(3)
-                    if not self._is_run:
-                        self._socket.close()
-                        self._socket = None
-                        return
-            while self._is_run:
-                try:
-                    msg = self._socket.recv(1024)
-                    _LOGGER.debug(f"Received {binascii.hexlify(msg)}")
-                    if not self._is_run:
-                        break
-                    msg_len = len(msg)
-                    if msg_len == 0:
-                        raise socket.error
-                    if msg_len == 97:  # 本地数据上报应有长度
-                        fan_state, sensor_state = self.read_state_message(msg)
-                        _LOGGER.debug(f"fan_state = {fan_state}, sensor_state = {sensor_state}")
-                        if len(fan_state) > 0:
-                            if not self._on_fan_state_changed(fan_state):
-                                self._is_on = None
-                                self._mode = None
-                                self._speed = None
-                        if len(sensor_state) > 0:
-                            if not self._on_sensor_state_changed(sensor_state):
-                                self._pm_25 = None
-                                self._voc = None
-                                self._temperature = None
-                                self._humidity = None
-                                self._filter = None
-                except socket.timeout:
-                    pass
-                except socket.error:
-                    _LOGGER.debug(f"Except socket.error {socket.error.errno} raised in socket.recv()")
-                    with self._lock:
-                        self._socket.close()
-                        self._socket = None
-                        break
+    def publish(self, value, now):
+        self._value = value
+        self._published = now
+        self.pending = None
 
 
 class StateManager:
-    def __init__(self, host, port):
-        self._device = DeviceInterface(host, port, self.on_fan_state_changed, self.on_sensor_state_changed)
-        self._sensor_updates = {}
-        self._fan_update = None
-
-    def add_sensor_update(self, sensor_type, handler):
-        self._sensor_updates[sensor_type] = handler
-
-    def set_fan_update(self, handler):
-        self._fan_update = handler
-
-    def on_fan_state_changed(self, fan_state):
-        if self._fan_update is not None:
-            self._fan_update(fan_state)
-            return True
+    """Home Assistant side of one device.
+
+    Entities subscribe to the DeviceState fields they show and unsubscribe
+    when they are removed from Home Assistant. The fan gets
+    update_status() with the DeviceState when one of FAN_MASK changes, a
+    sensor gets its (filtered) value. update_status() returns whether the
+    entity state changed, all changed entities of a report are written in a
+    single loop callback. Sensors with reading statistics are also written
+    every STATISTICS_INTERVAL so their attributes don't freeze on a steady
+    unit.
+    """
+    def __init__(self, host, port, poll_offset=0):
+        self._device = DeviceInterface(
+            host, port, self.on_state_changed, poll_offset, self.on_available_changed)
+        self._loop = None
+        self._subscriptions = []
+        self._sensors = {}
+        self._dirty = {}
+        self._flush_handle = None
+        self._filters = {}
+        self._pending_handle = None
+        self._statistics_handle = None
+        self._change_listener = None
+        self._field_listener = None
+        self._offered = 0
+        self._proxy = None
+
+    def _subscribe(self, mask, field, entity):
+        # field为None时实体接收整个DeviceState
+        self._subscriptions = [
+            subscription for subscription in self._subscriptions
+            if subscription[0] != mask or subscription[1] != field
+        ]
+        self._subscriptions.append((mask, field, entity))
+        state = self._device.state
+        if field is None:
+            if state.diff(DeviceState(), mask):
+                entity.update_status(state)
+        elif getattr(state, field) is not None:
+            entity.update_status(getattr(state, field))
+
+    def _unsubscribe(self, mask, field):
+        for subscription in self._subscriptions:
+            if subscription[0] == mask and subscription[1] == field:
+                self._subscriptions.remove(subscription)
+                # 已移除的实体不再写入, 否则会覆盖HA卸载时写入的状态
+                self._dirty.pop(subscription[2], None)
+                return
+
+    def add_sensor(self, sensor_type, sensor):
+        self._sensors[sensor_type] = sensor
+        self._subscribe(FIELD_BITS[sensor_type], sensor_type, sensor)
+
+    def remove_sensor(self, sensor_type):
+        self._sensors.pop(sensor_type, None)
+        self._unsubscribe(FIELD_BITS[sensor_type], sensor_type)
+
+    def set_fan(self, fan):
+        self._subscribe(FAN_MASK, None, fan)
+
+    def remove_fan(self):
+        self._unsubscribe(FAN_MASK, None)
+
+    def restore(self, snapshot):
+        # 重启后以上次保存的状态初始化实体与差分缓存, 需在实体注册与async_open()前调用
+        self._device.restore(snapshot)
+
+    def snapshot(self):
+        return self._device.snapshot()
+
+    def set_change_listener(self, listener):
+        self._change_listener = listener
+
+    def set_field_listener(self, listener):
+        """Call listener(fields) with the EXTRA_FIELDS that got a value, once per field."""
+        self._field_listener = listener
+        self._offer_fields(self._device.state.diff(DeviceState(), EXTRA_MASK))
+
+    def _offer_fields(self, changed):
+        # 未预定义实体的寄存器首次有值时通知平台创建实体
+        new = changed & EXTRA_MASK & ~self._offered
+        if new and self._field_listener is not None:
+            self._offered |= new
+            self._field_listener([field for field in EXTRA_FIELDS if FIELD_BITS[field] & new])
+
+    def on_state_changed(self, state, changed):
+        self._offer_fields(changed)
+        now = None
+        for mask, field, entity in self._subscriptions:
+            if not changed & mask:
+                continue
+            if field is None:
+                if entity.update_status(state):
+                    self._dirty[entity] = None
+                continue
+            value = getattr(state, field)
+            sensor_filter = self._filters.get(field)
+            if sensor_filter is not None:
+                if now is None:
+                    now = time.monotonic()
+                if not sensor_filter.offer(value, now):
+                    if sensor_filter.pending is not None:
+                        self._schedule_pending(sensor_filter.due - now)
+                    continue
+            if entity.update_status(value):
+                self._dirty[entity] = None
+        self._schedule_flush()
+        if changed & REPORT_MASK and self._change_listener is not None:
+            self._change_listener()
+
+    def on_available_changed(self, available):
+        _LOGGER.debug(f"Device available: {available}")
+        for subscription in self._subscriptions:
+            self._dirty[subscription[2]] = None
+        self._schedule_flush()
+
+    def set_sensor_filter(self, sensor_type, deadband, min_interval):
+        self._device.set_poll_deadband(sensor_type, deadband)
+        sensor_filter = self._filters.get(sensor_type)
+        if sensor_filter is None:
+            self._filters[sensor_type] = SensorFilter(deadband, min_interval)
         else:
-            return False
-
-    def on_sensor_state_changed(self, sensor_state):
-        result = True
-        for sensor_type in sensor_state:
-            if sensor_type in self._sensor_updates:
-                self._sensor_updates[sensor_type](sensor_state[sensor_type])
-            else:
-                result = False
-        return result
-
-    def open(self):
-        self._device.open(True)
+            sensor_filter.deadband = deadband
+            sensor_filter.min_interval = min_interval
+
+    @property
+    def suppressed_updates(self):
+        return {sensor_type: sensor_filter.suppressed for sensor_type, sensor_filter in self._filters.items()}
+
+    def _schedule_pending(self, delay):
+        if self._loop is None:
+            return
+        if self._pending_handle is not None:
+            if self._pending_handle.when() <= self._loop.time() + delay:
+                return
+            self._pending_handle.cancel()
+        self._pending_handle = self._loop.call_later(delay, self._publish_pending)
+
+    def _publish_pending(self):
+        # 限速期间保留的最新值到期后发布
+        self._pending_handle = None
+        now = time.monotonic()
+        next_due = None
+        for sensor_type, sensor_filter in self._filters.items():
+            if sensor_filter.pending is None:
+                continue
+            if sensor_filter.due <= now:
+                state = sensor_filter.pending
+                sensor_filter.publish(state, now)
+                sensor = self._sensors.get(sensor_type)
+                if sensor is not None and sensor.update_status(state):
+                    self._dirty[sensor] = None
+            elif next_due is None or sensor_filter.due < next_due:
+                next_due = sensor_filter.due
+        if next_due is not None:
+            self._schedule_pending(next_due - now)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is None and self._loop is not None and len(self._dirty) > 0:
+            self._flush_handle = self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        dirty = self._dirty
+        self._dirty = {}
+        for entity in dirty:
+            # 实体尚未加入HA时, 加入时会写入当前状态; 已移除的实体取消订阅时已从_dirty中去掉
+            if entity.hass is not None:
+                entity.async_write_ha_state()
+
+    def _refresh_statistics(self):
+        self._statistics_handle = self._loop.call_later(STATISTICS_INTERVAL, self._refresh_statistics)
+        if not self.available:
+            return
+        for field in HISTORY_FIELDS:
+            sensor = self._sensors.get(field)
+            if sensor is not None:
+                self._dirty[sensor] = None
+        self._schedule_flush()
 
     async def async_open(self):
-        pass
+        self._loop = asyncio.get_running_loop()
+        if self._statistics_handle is None:
+            self._statistics_handle = self._loop.call_later(STATISTICS_INTERVAL, self._refresh_statistics)
+        return await self._device.async_open()
 
     def close(self):
+        if self._proxy is not None:
+            self._proxy.close()
+            self._proxy = None
         self._device.close()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending_handle is not None:
+            self._pending_handle.cancel()
+            self._pending_handle = None
+        if self._statistics_handle is not None:
+            self._statistics_handle.cancel()
+            self._statistics_handle = None
+        self._dirty.clear()
 
     def turn_on(self):
-        self._device.turn_on()
+        return self._device.turn_on()
 
     def turn_off(self):
-        self._device.turn_off()
+        return self._device.turn_off()
 
     def set_mode(self, mode):
-        self._device.set_mode(mode)
+        return self._device.set_mode(mode)
 
     def set_speed(self, speed):
-        self._device.set_speed(speed)
+        return self._device.set_speed(speed)
+
+    def set_poll_interval(self, min_interval, max_interval):
+        self._device.set_poll_interval(min_interval, max_interval)
+
+    @property
+    def poll_interval(self):
+        return self._device.poll_interval
+
+    @property
+    def state(self):
+        return self._device.state
+
+    @property
+    def link_state(self):
+        return self._device.link_state
+
+    @property
+    def available(self):
+        return self._device.available
+
+    @property
+    def history(self):
+        return self._device.history
+
+    async def async_set_proxy(self, port):
+        """Serve the device session to local clients on port, 0 disables the proxy."""
+        if self._proxy is not None:
+            if self._proxy.port == port:
+                return
+            await self._proxy.async_stop()
+            self._proxy = None
+        if port > 0:
+            proxy = DeviceProxy(self._device, port=port)
+            try:
+                await proxy.async_start()
+                self._proxy = proxy
+            except OSError as e:
+                _LOGGER.error(f"Unable to start proxy on port {port}, {e}")
+
+    def start_capture(self, capture):
+        self._device.start_capture(capture)
+
+    def stop_capture(self):
+        return self._device.stop_capture()
+
+    def diagnostics(self):
+        result = self._device.diagnostics()
+        result["suppressed_updates"] = self.suppressed_updates
+        if self._proxy is not None:
+            result["proxy"] = self._proxy.diagnostics()
+        return result
+
+    def statistics(self, sensor_type):
+        return self._device.history.statistics(sensor_type, time.monotonic())
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# protocol与device_test.py一样从集成目录导入, 不依赖Home Assistant
+sys.path.insert(0, os.path.join(ROOT, "custom_components", "zhijing_freshair"))
+sys.path.insert(0, ROOT)
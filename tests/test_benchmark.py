@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from protocol import device
+from protocol.const import (
+    SPEED_LOW,
+    SPEED_HIGH
+)
+from protocol.device import (
+    DeviceInterface,
+    decode_reports
+)
+from protocol.fake_device import FakeDevice
+
+pytest.importorskip("pytest_benchmark")
+
+FRAMES = 1000
+
+
+def on_state_changed(state, changed):
+    pass
+
+
+@pytest.fixture
+def reports():
+    fake = FakeDevice()
+    result = []
+    for i in range(FRAMES):
+        fake.pm2_5 = i % 200
+        result.append(fake.report())
+    return result
+
+
+def test_stream_decode(benchmark, reports):
+    stream = b"".join(reports)
+    interface = DeviceInterface("127.0.0.1", 0, on_state_changed)
+
+    def decode():
+        for pos in range(0, len(stream), 1024):
+            interface.data_received(stream[pos: pos + 1024])
+
+    benchmark(decode)
+    assert interface.stats.frames_dropped == 0
+    assert interface.state.pm2_5 == (FRAMES - 1) % 200
+
+
+def test_batch_decode(benchmark, reports):
+    columns = benchmark(decode_reports, reports)
+    assert list(columns["pm2_5"][:3]) == [0, 1, 2]
+    assert len(columns["temperature"]) == FRAMES
+
+
+@pytest.fixture
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_command_round_trip(benchmark, event_loop, monkeypatch):
+    # 不限命令间隔, 测量写出到上报确认的往返
+    monkeypatch.setattr(device, "COMMAND_INTERVAL", 0)
+    fake = FakeDevice()
+    event_loop.run_until_complete(fake.async_start())
+    interface = DeviceInterface(fake.host, fake.port, on_state_changed)
+    interface.set_poll_interval(0.01, 0.01)
+    event_loop.run_until_complete(interface.async_open())
+    speeds = [SPEED_LOW, SPEED_HIGH]
+
+    async def async_set_speed(speed):
+        return await interface.set_speed(speed)
+
+    def round_trip():
+        speeds.reverse()
+        return event_loop.run_until_complete(async_set_speed(speeds[0]))
+
+    try:
+        result = benchmark.pedantic(round_trip, rounds=20, warmup_rounds=1)
+    finally:
+        interface.close()
+        event_loop.run_until_complete(fake.async_stop())
+    assert result is True
+    assert fake.commands > 0
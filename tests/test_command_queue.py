@@ -0,0 +1,83 @@
+import asyncio
+
+from protocol import device
+from protocol.const import (
+    FIELD_SPEED,
+    SPEED_LOW,
+    SPEED_HIGH
+)
+from protocol.device import (
+    CommandQueue,
+    SPEED_MESSAGES
+)
+from protocol.state import DeviceState
+
+
+def make_state(speed):
+    state = DeviceState()
+    state.speed = speed
+    return state
+
+
+def test_newer_command_takes_over_waiters(monkeypatch):
+    monkeypatch.setattr(device, "COMMAND_INTERVAL", 0)
+
+    async def run():
+        written = []
+        queue = CommandQueue(lambda msg: written.append(msg) or True)
+        queue.set_ready(True)
+        first = queue.submit(FIELD_SPEED, SPEED_LOW, SPEED_MESSAGES[SPEED_LOW])
+        second = queue.submit(FIELD_SPEED, SPEED_HIGH, SPEED_MESSAGES[SPEED_HIGH])
+        await asyncio.sleep(0.01)
+        # 排队中的命令被取代, 只写出最新的一条
+        assert written == [SPEED_MESSAGES[SPEED_HIGH]]
+        queue.confirm(make_state(SPEED_LOW))
+        assert not first.done()
+        queue.confirm(make_state(SPEED_HIGH))
+        assert first.result() is True
+        assert second.result() is True
+
+    asyncio.run(run())
+
+
+def test_commands_wait_for_ready(monkeypatch):
+    monkeypatch.setattr(device, "COMMAND_INTERVAL", 0)
+
+    async def run():
+        written = []
+        queue = CommandQueue(lambda msg: written.append(msg) or True)
+        future = queue.submit(FIELD_SPEED, SPEED_HIGH, SPEED_MESSAGES[SPEED_HIGH])
+        await asyncio.sleep(0.01)
+        assert written == []
+        queue.set_ready(True)
+        await asyncio.sleep(0.01)
+        assert written == [SPEED_MESSAGES[SPEED_HIGH]]
+        queue.clear()
+        assert future.result() is False
+
+    asyncio.run(run())
+
+
+def test_unconfirmed_command_expires(monkeypatch):
+    monkeypatch.setattr(device, "COMMAND_INTERVAL", 0)
+    monkeypatch.setattr(device, "COMMAND_TIMEOUT", 0.05)
+
+    async def run():
+        queue = CommandQueue(lambda msg: True)
+        queue.set_ready(True)
+        future = queue.submit(FIELD_SPEED, SPEED_HIGH, SPEED_MESSAGES[SPEED_HIGH])
+        assert await asyncio.wait_for(future, 1) is False
+
+    asyncio.run(run())
+
+
+def test_failed_write_resolves_false(monkeypatch):
+    monkeypatch.setattr(device, "COMMAND_INTERVAL", 0)
+
+    async def run():
+        queue = CommandQueue(lambda msg: False)
+        queue.set_ready(True)
+        future = queue.submit(FIELD_SPEED, SPEED_HIGH, SPEED_MESSAGES[SPEED_HIGH])
+        assert await asyncio.wait_for(future, 1) is False
+
+    asyncio.run(run())
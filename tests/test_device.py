@@ -0,0 +1,91 @@
+import asyncio
+
+from protocol import device
+from protocol.const import (
+    MODE_TIMING,
+    SPEED_HIGH,
+    STATE_OFF
+)
+from protocol.device import (
+    DeviceInterface,
+    LINK_CLOSED,
+    LINK_CONNECTED
+)
+from protocol.fake_device import FakeDevice
+
+
+async def wait_for(condition, timeout=5):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_report_and_commands():
+    async def run():
+        fake = FakeDevice()
+        await fake.async_start()
+        changes = []
+        interface = DeviceInterface(fake.host, fake.port, lambda state, changed: changes.append(changed))
+        interface.set_poll_interval(0.05, 0.05)
+        try:
+            assert await interface.async_open() is True
+            await wait_for(lambda: interface.available)
+            state = interface.state
+            assert (state.temperature, state.humidity, state.pm2_5, state.filter) == (25, 50, 12, 80)
+            assert len(changes) > 0
+
+            results = await asyncio.gather(
+                interface.set_speed(SPEED_HIGH), interface.set_mode(MODE_TIMING), interface.turn_off())
+            assert results == [True, True, True]
+            assert (state.speed, state.mode, state.state) == (SPEED_HIGH, MODE_TIMING, STATE_OFF)
+            assert fake.commands == 3
+
+            fake.pm2_5 = 300
+            await wait_for(lambda: state.pm2_5 == 300)
+        finally:
+            interface.close()
+            await fake.async_stop()
+
+    asyncio.run(run())
+
+
+def test_reconnect_after_disconnect(monkeypatch):
+    monkeypatch.setattr(device, "RECONNECT_MIN_INTERVAL", 0.01)
+
+    async def run():
+        fake = FakeDevice()
+        await fake.async_start()
+        available = []
+        interface = DeviceInterface(fake.host, fake.port, lambda state, changed: None, 0, available.append)
+        interface.set_poll_interval(0.05, 0.05)
+        try:
+            await interface.async_open()
+            await wait_for(lambda: interface.available)
+            fake.disconnect()
+            await wait_for(lambda: len(available) == 3)
+            assert interface.link_state == LINK_CONNECTED
+            assert interface.stats.reconnects == 1
+            assert available == [True, False, True]
+        finally:
+            interface.close()
+            await fake.async_stop()
+        assert interface.link_state == LINK_CLOSED
+        assert await interface.set_speed(SPEED_HIGH) is False
+
+    asyncio.run(run())
+
+
+def test_unreachable_device():
+    async def run():
+        fake = FakeDevice()
+        await fake.async_start()
+        await fake.async_stop()
+        interface = DeviceInterface(fake.host, fake.port, lambda state, changed: None)
+        try:
+            assert await interface.async_open() is False
+            assert not interface.available
+        finally:
+            interface.close()
+
+    asyncio.run(run())
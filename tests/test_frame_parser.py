@@ -0,0 +1,53 @@
+from protocol.device import (
+    FrameParser,
+    MESSAGE_GET_DATA,
+    MSG_HEADER
+)
+from protocol.fake_device import FakeDevice
+
+
+def frames(parser, data):
+    return [bytes(msg) for msg in parser.feed(data)]
+
+
+def test_frames_split_across_reads():
+    report = FakeDevice().report()
+    stream = report + MESSAGE_GET_DATA + report
+    for size in (1, 3, 7, 64):
+        parser = FrameParser()
+        result = []
+        for pos in range(0, len(stream), size):
+            result += frames(parser, stream[pos: pos + size])
+        assert result == [report, MESSAGE_GET_DATA, report]
+        assert parser.skipped == 0
+
+
+def test_garbage_is_skipped():
+    report = FakeDevice().report()
+    parser = FrameParser()
+    assert frames(parser, b"\x00\x01garbage" + report) == [report]
+    assert parser.skipped == 9
+
+
+def test_trailing_header_byte_is_kept():
+    report = FakeDevice().report()
+    parser = FrameParser()
+    assert frames(parser, b"xyz" + report[:1]) == []
+    assert frames(parser, report[1:]) == [report]
+    assert parser.skipped == 3
+
+
+def test_resync_after_bad_length():
+    report = FakeDevice().report()
+    parser = FrameParser()
+    # 长度字段超出MSG_MAX_LENGTH的伪包头
+    assert frames(parser, MSG_HEADER + b"\xff\xff" + report) == [report]
+    assert parser.malformed == 1
+    assert parser.skipped == 4
+
+
+def test_resync_inside_truncated_frame():
+    report = FakeDevice().report()
+    parser = FrameParser()
+    assert frames(parser, MSG_HEADER + b"\x00\x01" + report) == [report]
+    assert parser.malformed == 1
@@ -0,0 +1,54 @@
+import random
+
+from protocol.history import (
+    ReadingHistory,
+    WINDOWS
+)
+
+
+def expected(samples, now, span):
+    values = [value for time, value in samples if time >= now - span]
+    return min(values), max(values), round(sum(values) / len(values), 2)
+
+
+def check(history, kept, capacity):
+    now = kept[-1][0]
+    for field, column in (("a", 1), ("b", 2)):
+        statistics = history.statistics(field)
+        samples = [(sample[0], sample[column]) for sample in kept[-capacity:]]
+        for name, span in WINDOWS.items():
+            minimum, maximum, mean = expected(samples, now, span)
+            assert statistics[f"min_{name}"] == minimum
+            assert statistics[f"max_{name}"] == maximum
+            assert abs(statistics[f"mean_{name}"] - mean) < 0.011
+
+
+def test_statistics_match_brute_force():
+    # 随机间隔与随机读取间隔, 包括读取之间样本被覆盖的情况
+    rng = random.Random(0)
+    for capacity in (16, 50, 300):
+        history = ReadingHistory(["a", "b"], capacity=capacity, resolution=0)
+        kept = []
+        now = 0
+        for i in range(3000):
+            now += rng.choice([0.5, 1, 2, 5, 30, 120])
+            sample = (now, rng.randint(0, 100), rng.random())
+            history.add(*sample)
+            kept.append(sample)
+            if rng.random() < 0.05:
+                check(history, kept, capacity)
+        check(history, kept, capacity)
+
+
+def test_close_samples_are_skipped():
+    history = ReadingHistory(["a"], capacity=8, resolution=1)
+    for now, value in ((0, 1), (0.5, 100), (1, 2), (1.9, 100), (2, 3)):
+        history.add(now, value)
+    assert history.samples("a") == [(0, 1), (1, 2), (2, 3)]
+    assert history.statistics("a")["max_1m"] == 3
+
+
+def test_empty_and_unknown_fields():
+    history = ReadingHistory(["a"])
+    assert history.statistics("a") == {}
+    assert history.statistics("b") is None
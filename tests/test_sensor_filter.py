@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.zhijing_freshair.statemanager import SensorFilter  # noqa: E402
+
+
+def test_deadband():
+    sensor_filter = SensorFilter(deadband=2)
+    assert sensor_filter.offer(10, 100) is True
+    assert sensor_filter.offer(12, 101) is False
+    assert sensor_filter.offer(8, 102) is False
+    assert sensor_filter.offer(13, 103) is True
+    assert sensor_filter.suppressed == 2
+    assert sensor_filter.pending is None
+
+
+def test_deadband_float_rounding():
+    sensor_filter = SensorFilter(deadband=0.1)
+    assert sensor_filter.offer(0.3, 100) is True
+    # 0.4 - 0.3 在浮点下略大于0.1
+    assert sensor_filter.offer(0.4, 101) is False
+    assert sensor_filter.offer(0.5, 102) is True
+
+
+def test_rate_limit_holds_latest_value():
+    sensor_filter = SensorFilter(min_interval=30)
+    assert sensor_filter.offer(10, 100) is True
+    assert sensor_filter.offer(11, 105) is False
+    assert sensor_filter.offer(12, 110) is False
+    assert sensor_filter.pending == 12
+    assert sensor_filter.due == 130
+    # 回到已发布值时丢弃保留的值
+    assert sensor_filter.offer(10, 120) is False
+    assert sensor_filter.pending is None
+    assert sensor_filter.offer(15, 131) is True
+    assert sensor_filter.suppressed == 3